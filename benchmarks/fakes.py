@@ -0,0 +1,162 @@
+# benchmarks/fakes.py
+import asyncio
+import json
+import random
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+
+def _pm25_for_aqi(aqi: int) -> float:
+    """Обратная к формуле EPA: концентрация PM2.5 (бинарный поиск), при которой суб-индекс равен aqi."""
+    from utils.aqi import compute_sub_index
+
+    low, high = 0.0, 500.0
+    for _ in range(40):
+        middle = (low + high) / 2
+        if compute_sub_index("pm25", middle) < aqi:
+            low = middle
+        else:
+            high = middle
+    return high
+
+
+class FakeUpstreamServer:
+    """
+    Локальный HTTP-сервер, имитирующий WAQI (/feed/geo:lat;lon/), Nominatim (/search),
+    Open-Meteo (/v1/air-quality) и Sensor.Community (/airrohr/v1/filter/area=lat,lon,radius).
+    Ответы детерминированы: AQI зависит только от координат и seed. Считает число запросов.
+    """
+
+    def __init__(self, seed: int = 42, latency: float = 0.0):
+        self.seed = seed
+        self.latency = latency
+        self.calls = {"waqi": 0, "nominatim": 0, "open_meteo": 0, "sensor_community": 0}
+        self._server = None
+        self.port = None
+
+    @property
+    def waqi_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/feed/geo:{{lat}};{{lon}}/"
+
+    @property
+    def nominatim_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/search"
+
+    @property
+    def open_meteo_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1/air-quality"
+
+    @property
+    def sensor_community_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/airrohr/v1/filter/area={{lat}},{{lon}},{{radius}}"
+
+    def aqi_for(self, latitude: float, longitude: float) -> int:
+        rnd = random.Random(f"{self.seed}:{latitude:.3f}:{longitude:.3f}")
+        return rnd.randint(20, 260)
+
+    def _waqi_payload(self, path: str) -> dict:
+        lat, _, lon = path[len("/feed/geo:"):].rstrip("/").partition(";")
+        aqi = self.aqi_for(float(lat), float(lon))
+        return {
+            "status": "ok",
+            "data": {
+                "aqi": aqi,
+                "city": {"name": "Bishkek (fake)"},
+                "time": {"s": time.strftime("%Y-%m-%d %H:00:00")},
+                "iaqi": {"pm25": {"v": aqi}, "pm10": {"v": aqi // 2}},
+            },
+        }
+
+    def _open_meteo_payload(self, query: dict) -> dict:
+        aqi = self.aqi_for(float(query["latitude"][0]), float(query["longitude"][0]))
+        # Модельная сетка сглаживает пики: значение немного ниже станционного
+        return {"current": {"time": time.strftime("%Y-%m-%dT%H:00", time.gmtime()), "interval": 3600,
+                            "us_aqi": round(aqi * 0.9)}}
+
+    def _sensor_community_payload(self, path: str) -> list:
+        lat, lon, _ = path[len("/airrohr/v1/filter/area="):].split(",")
+        aqi = self.aqi_for(float(lat), float(lon))
+        rnd = random.Random(f"{self.seed}:{lat}:{lon}:sensors")
+        # Концентрация PM2.5, дающая тот же AQI, с разбросом датчиков и одним неисправным датчиком
+        pm25 = _pm25_for_aqi(aqi)
+        sensors = [pm25 * rnd.uniform(0.85, 1.15) for _ in range(4)] + [999.9]
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        return [
+            {"timestamp": timestamp, "sensor": {"id": 1000 + i},
+             "sensordatavalues": [{"value_type": "P2", "value": f"{value:.2f}"}]}
+            for i, value in enumerate(sensors)
+        ]
+
+    def _nominatim_payload(self, query: dict) -> list:
+        q = query.get("q", [""])[0]
+        limit = int(query.get("limit", ["1"])[0])
+        rnd = random.Random(f"{self.seed}:{q}")
+        return [
+            {"lat": str(42.80 + rnd.random() * 0.15), "lon": str(74.50 + rnd.random() * 0.20),
+             "display_name": f"{q.split(',')[0]} #{i + 1}, Бишкек"}
+            for i in range(limit)
+        ]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = (await reader.readline()).decode("latin-1")
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            target = urlsplit(request_line.split()[1])
+            path = unquote(target.path)
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if path.startswith("/feed/geo:"):
+                self.calls["waqi"] += 1
+                body = self._waqi_payload(path)
+            elif path == "/v1/air-quality":
+                self.calls["open_meteo"] += 1
+                body = self._open_meteo_payload(parse_qs(target.query))
+            elif path.startswith("/airrohr/v1/filter/area="):
+                self.calls["sensor_community"] += 1
+                body = self._sensor_community_payload(path)
+            elif path == "/search":
+                self.calls["nominatim"] += 1
+                body = self._nominatim_payload(parse_qs(target.query))
+            else:
+                body = {"status": "error", "data": "unknown path"}
+            payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1")
+                + payload
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+
+class FakeBot:
+    """Имитация telegram.Bot: записывает отправленные сообщения вместо отправки."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.sent.append((chat_id, text))
+        return None
+
+
+class FakeContext:
+    """Минимальный контекст задания JobQueue: у обработчиков используется только context.bot."""
+
+    def __init__(self, bot: FakeBot):
+        self.bot = bot
+        self.bot_data = {}
+        self.user_data = {}
@@ -0,0 +1,87 @@
+# benchmarks/generators.py
+import random
+import sqlite3
+
+# Примерные границы Бишкека
+LAT_RANGE = (42.80, 42.95)
+LON_RANGE = (74.50, 74.70)
+
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+
+def generate_locations(count: int, seed: int = 42) -> list[tuple[float, float, str]]:
+    """Генерирует точки-районы в пределах города: (latitude, longitude, name)."""
+    rnd = random.Random(seed)
+    return [
+        (round(rnd.uniform(*LAT_RANGE), 4), round(rnd.uniform(*LON_RANGE), 4), f"Район {i + 1}")
+        for i in range(count)
+    ]
+
+
+def generate_subscriptions(count: int, locations: list, seed: int = 42):
+    """
+    Генерирует строки подписок для таблицы subscriptions.
+    Тихие часы отключены (quiet_start == quiet_end), а порог 0 не используется,
+    чтобы результат не зависел от времени суток запуска.
+    """
+    rnd = random.Random(seed)
+    thresholds = (50, 100, 150, 200)
+    for user_id in range(1, count + 1):
+        latitude, longitude, name = locations[rnd.randrange(len(locations))]
+        yield (user_id, user_id, latitude, longitude, name, rnd.choice(thresholds), 1, 0, 0)
+
+
+def populate_database(path: str, count: int, locations: list, seed: int = 42) -> None:
+    """Заполняет БД (уже инициализированную database.db.init_db) синтетическими подписками."""
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO subscriptions
+        (user_id, chat_id, latitude, longitude, location_name, aqi_threshold, is_active, quiet_start, quiet_end)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        generate_subscriptions(count, locations, seed),
+    )
+    conn.commit()
+    conn.close()
+
+
+def generate_readings(locations: list, start: float, days: int, interval: float, seed: int = 42):
+    """
+    Генерирует историю показаний для таблицы readings: каждая точка опрашивается раз в interval секунд.
+    AQI меняется по суткам и сезону (зимой выше), как в benchmarks/simulation.py.
+    """
+    import json
+    import math
+
+    rnd = random.Random(seed)
+    steps = int(days * 24 * 3600 / interval)
+    for step in range(steps):
+        recorded_at = start + step * interval
+        day_of_year = (recorded_at / 86400) % 365
+        winter = (math.cos(2 * math.pi * (day_of_year - 15) / 365) + 1) / 2
+        hour = (recorded_at / 3600 + 6) % 24
+        evening = math.exp(-((min(abs(hour - 22), 24 - abs(hour - 22))) / 4) ** 2)
+        for latitude, longitude, name in locations:
+            aqi = max(5, round(30 + 60 * winter + 120 * winter * evening + rnd.gauss(0, 8)))
+            iaqi = json.dumps({"PM2.5": aqi, "PM10": aqi // 2})
+            yield recorded_at, round(latitude, 3), round(longitude, 3), name, aqi, iaqi, "waqi"
+
+
+def populate_readings(path: str, rows) -> int:
+    """Заполняет таблицу readings строками generate_readings. Возвращает число строк."""
+    conn = sqlite3.connect(path)
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= 10_000:
+            conn.executemany("INSERT INTO readings VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO readings VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+        count += len(batch)
+    conn.commit()
+    conn.close()
+    return count
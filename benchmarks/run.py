@@ -0,0 +1,676 @@
+# benchmarks/run.py
+"""
+Воспроизводимые бенчмарки бота.
+
+Запуск из корня репозитория:
+    python -m benchmarks.run --scenario sweep --size 1k
+    python -m benchmarks.run --scenario sweep --size 100k --locations 500
+    python -m benchmarks.run --scenario aqi
+    python -m benchmarks.run --scenario import_time
+    python -m benchmarks.run --scenario metrics_overhead
+    python -m benchmarks.run --scenario persistence --size 100k
+    python -m benchmarks.run --scenario adaptive_polling [--readings winter.csv]
+    python -m benchmarks.run --scenario subscriber_index --size 1m
+    python -m benchmarks.run --scenario sources --upstream-latency 0.2
+    python -m benchmarks.run --scenario export
+    python -m benchmarks.run --scenario crash_recovery --size 1k --send-latency 0.005
+
+Результаты сохраняются в JSON (по умолчанию benchmarks/results/<коммит>-<сценарий>.json),
+чтобы их можно было сравнивать между коммитами.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+os.environ.setdefault("AQICN_API_KEY", "benchmark")
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss в Linux — в килобайтах
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def _run_sweep(args) -> dict:
+    from benchmarks.fakes import FakeBot, FakeContext, FakeUpstreamServer
+    from benchmarks.generators import SIZES, generate_locations, populate_database
+    from database import db
+    from handlers import notifications
+    from handlers.notifications import send_aqi_notifications
+    from utils import metrics, sources
+    from utils.adaptive_polling import AdaptivePoller
+    from utils.cache import air_quality_cache
+    from utils.subscriber_index import load_subscriber_index
+
+    count = SIZES.get(args.size) or int(args.size)
+    args.locations = args.locations or 300
+    workdir = tempfile.mkdtemp(prefix="ecomonitor-bench-")
+    db.DATABASE_NAME = os.path.join(workdir, "subscriptions.db")
+    db.init_db()
+
+    started = time.perf_counter()
+    locations = generate_locations(args.locations, args.seed)
+    populate_database(db.DATABASE_NAME, count, locations, args.seed)
+    populate_seconds = time.perf_counter() - started
+    # БД заполнена в обход database.db, поэтому индекс подписчиков строится заново
+    load_subscriber_index()
+
+    server = FakeUpstreamServer(seed=args.seed, latency=args.upstream_latency)
+    await server.start()
+    sources.AQICN_API_BASE_URL = server.waqi_url
+
+    runs = []
+    try:
+        for run in range(args.runs):
+            # Каждый прогон начинается с холодного кэша показаний, как после перезапуска
+            air_quality_cache._entries.clear()
+            # ...и с пустым планировщиком, иначе второй прогон не опросит ни одной локации
+            notifications.poller = AdaptivePoller()
+            bot = FakeBot(latency=args.send_latency)
+            calls_before = dict(server.calls)
+            db_count_before, db_time_before = metrics.db_duration.totals()
+
+            started = time.perf_counter()
+            await send_aqi_notifications(FakeContext(bot))
+            duration = time.perf_counter() - started
+
+            db_count_after, db_time_after = metrics.db_duration.totals()
+            runs.append({
+                "run": run + 1,
+                "sweep_seconds": round(duration, 4),
+                "upstream_calls": {k: server.calls[k] - calls_before[k] for k in server.calls},
+                "db_calls": db_count_after - db_count_before,
+                "db_seconds": round(db_time_after - db_time_before, 4),
+                "messages_sent": len(bot.sent),
+                "peak_rss_mb": round(_peak_rss_mb(), 1),
+            })
+    finally:
+        await server.stop()
+
+    return {
+        "subscribers": count,
+        "locations": args.locations,
+        "populate_seconds": round(populate_seconds, 3),
+        "runs": runs,
+    }
+
+
+def _legacy_aqi_category(aqi: int) -> tuple[str, str]:
+    """Прежняя цепочка if из main.py (до utils/aqi.py) — эталон для проверки."""
+    if aqi <= 50:
+        return "Хорошо", "🟢"
+    elif aqi <= 100:
+        return "Умеренно", "🟡"
+    elif aqi <= 150:
+        return "Неблагоприятно для чувствительных групп", "🟠"
+    elif aqi <= 200:
+        return "Неблагоприятно", "🔴"
+    elif aqi <= 300:
+        return "Очень неблагоприятно", "🟣"
+    else:
+        return "Опасно", "🟤"
+
+
+def _run_aqi(args) -> dict:
+    """
+    Пропускная способность классификации AQI: classify_many и get_aqi_category против
+    прежней цепочки if на --size значениях (1k, 100k, 1m). Свойства utils/aqi.py проверяются в tests/test_aqi.py.
+    """
+    import random
+    from utils.aqi import classify_many, get_aqi_category
+    from benchmarks.generators import SIZES
+
+    count = SIZES.get(args.size) or int(args.size)
+    rnd = random.Random(args.seed)
+    values = [rnd.randint(0, 500) for _ in range(count)]
+    timings = {}
+    for name, function in (
+        ("if_chain", lambda: [_legacy_aqi_category(v) for v in values]),
+        ("get_aqi_category", lambda: [get_aqi_category(v) for v in values]),
+        ("classify_many", lambda: classify_many(values)),
+    ):
+        best = min(timeit.repeat(function, number=1, repeat=args.runs))
+        timings[name] = {"seconds": round(best, 4), "values_per_second": round(count / best)}
+
+    return {
+        "values": count,
+        "throughput": timings,
+    }
+
+
+def _run_import_time(args) -> dict:
+    """Холодный импорт main (python -X importtime), медиана по нескольким запускам."""
+    samples = []
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN="benchmark")
+    for _ in range(args.runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            capture_output=True, text=True, env=env,
+        )
+        for line in result.stderr.splitlines():
+            parts = [part.strip() for part in line.split("|")]
+            if len(parts) == 3 and parts[2] == "main":
+                samples.append(int(parts[1]))
+    samples.sort()
+    return {
+        "samples_us": samples,
+        "median_ms": round(samples[len(samples) // 2] / 1000, 2) if samples else None,
+    }
+
+
+def _run_metrics_overhead(args) -> dict:
+    """Накладные расходы декоратора metrics.timed на вызов (sync и async)."""
+    from utils import metrics
+
+    histogram = metrics.Histogram("benchmark_seconds", "benchmark")
+    number = 200_000
+
+    def plain():
+        return None
+
+    instrumented = metrics.timed(histogram, op="sync")(plain)
+    sync_ns = (timeit.timeit(instrumented, number=number) - timeit.timeit(plain, number=number)) / number * 1e9
+
+    async def plain_async():
+        return None
+
+    instrumented_async = metrics.timed(histogram, op="async")(plain_async)
+
+    async def loop(function):
+        started = time.perf_counter()
+        for _ in range(number):
+            await function()
+        return time.perf_counter() - started
+
+    async_ns = (asyncio.run(loop(instrumented_async)) - asyncio.run(loop(plain_async))) / number * 1e9
+    return {"sync_overhead_ns": round(sync_ns), "async_overhead_ns": round(async_ns)}
+
+
+async def _run_persistence(args) -> dict:
+    """
+    Пропускная способность обработки обновлений без persistence, с записью каждого изменения
+    и с отложенной записью (SQLitePersistence). Каждое "обновление" меняет user_data одного
+    пользователя и состояние его диалога, как шаг ConversationHandler.
+    """
+    from benchmarks.generators import SIZES
+    from database import db
+    from database.persistence import SQLitePersistence
+
+    count = SIZES.get(args.size) or int(args.size)
+    workdir = tempfile.mkdtemp(prefix="ecomonitor-bench-")
+    db.DATABASE_NAME = os.path.join(workdir, "subscriptions.db")
+    db.init_db()
+    users = 1000
+
+    async def process(persistence) -> float:
+        user_data = {}
+        started = time.perf_counter()
+        for i in range(count):
+            user_id = i % users
+            data = user_data.setdefault(user_id, {})
+            data['sub_latitude'] = 42.8 + i * 1e-6
+            data['sub_longitude'] = 74.6
+            if persistence is not None:
+                await persistence.update_user_data(user_id, data)
+                await persistence.update_conversation("sub_conversation", (user_id, user_id), i % 2 + 1)
+        if persistence is not None:
+            await persistence.flush()
+        return time.perf_counter() - started
+
+    off = await process(None)
+    unbatched = SQLitePersistence(flush_every=1)
+    every_change = await process(unbatched)
+    batched = SQLitePersistence()
+    write_behind = await process(batched)
+    return {
+        "updates": count,
+        "off_updates_per_s": round(count / off),
+        "every_change_updates_per_s": round(count / every_change),
+        "every_change_db_flushes": unbatched.flushes,
+        "write_behind_updates_per_s": round(count / write_behind),
+        "write_behind_db_flushes": batched.flushes,
+    }
+
+
+def _run_adaptive_polling(args) -> dict:
+    """
+    Симуляция недели опроса: фиксированный интервал 30 минут против адаптивного планировщика.
+    Показания берутся из CSV (--readings: timestamp,location,aqi; timestamp — UNIX-время)
+    или генерируются (зимняя неделя с вечерними инверсиями и летняя). Считаются запросы к API
+    и задержка обнаружения пересечения порогов подписчиков.
+    """
+    from benchmarks.simulation import load_readings, simulate_polling, synthetic_week
+    from utils.adaptive_polling import AdaptivePoller, BASE_POLL_INTERVAL
+
+    if args.readings:
+        datasets = {"recorded": load_readings(args.readings)}
+    else:
+        datasets = {season: synthetic_week(args.locations or 20, args.seed, season) for season in ("winter", "summer")}
+    thresholds = (100, 150, 200)
+
+    results = {"thresholds": thresholds}
+    for name, series in datasets.items():
+        fixed = simulate_polling(series, thresholds, fixed_interval=BASE_POLL_INTERVAL)
+        adaptive = simulate_polling(series, thresholds, poller=AdaptivePoller())
+        results[name] = {
+            "locations": len(series),
+            "fixed_30min": fixed,
+            "adaptive": adaptive,
+            "calls_saved_pct": round((1 - adaptive["calls"] / fixed["calls"]) * 100, 1) if fixed["calls"] else None,
+        }
+    return results
+
+
+def _run_subscriber_index(args) -> dict:
+    """
+    Отбор подписчиков для рассылки: прежний цикл по всем подпискам из БД
+    (get_all_active_subscriptions + evaluate_subscriptions) против индекса в памяти
+    (бинарный поиск по порогам и загрузка из БД только кандидатов).
+    Показания станций случайные, но воспроизводимые (--seed).
+    """
+    import random
+    import tracemalloc
+    from benchmarks.generators import SIZES, generate_locations, populate_database
+    from database import db
+    from utils import alerts
+    from utils.subscriber_index import SubscriberIndex
+
+    count = SIZES.get(args.size) or int(args.size)
+    args.locations = args.locations or 300
+    workdir = tempfile.mkdtemp(prefix="ecomonitor-bench-")
+    db.DATABASE_NAME = os.path.join(workdir, "subscriptions.db")
+    db.init_db()
+    locations = generate_locations(args.locations, args.seed)
+    populate_database(db.DATABASE_NAME, count, locations, args.seed)
+
+    started = time.perf_counter()
+    index = SubscriberIndex()
+    index.build(db.get_subscriber_columns())
+    build_seconds = time.perf_counter() - started
+
+    # Память замеряется отдельно: tracemalloc сильно замедляет построение
+    tracemalloc.start()
+    measured = SubscriberIndex()
+    measured.build(db.get_subscriber_columns())
+    index_mb = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.reset_peak()
+    tracemalloc.clear_traces()
+    subscriptions = db.get_all_active_subscriptions()
+    dicts_mb = tracemalloc.get_traced_memory()[0] / 2 ** 20
+    tracemalloc.stop()
+    del measured, subscriptions
+
+    rnd = random.Random(args.seed)
+    now = time.time()
+    runs = []
+    for run in range(args.runs):
+        # Обычный зимний вечер: большинство станций ниже большинства порогов
+        readings = {alerts.location_key(lat, lon): max(10, round(rnd.gauss(75, 35))) for lat, lon, _ in locations}
+
+        started = time.perf_counter()
+        subscriptions = db.get_all_active_subscriptions()
+        loop_events = alerts.evaluate_subscriptions(subscriptions, readings, now)
+        loop_seconds = time.perf_counter() - started
+        del subscriptions
+
+        started = time.perf_counter()
+        candidate_ids = []
+        for key, aqi in readings.items():
+            candidate_ids.extend(index.candidates(key, aqi))
+        candidates_seconds = time.perf_counter() - started
+        index_events = alerts.evaluate_subscriptions(db.get_subscriptions_by_ids(candidate_ids), readings, now)
+        index_seconds = time.perf_counter() - started
+
+        runs.append({
+            "run": run + 1,
+            "loop_seconds": round(loop_seconds, 3),
+            "index_seconds": round(index_seconds, 3),
+            "index_candidates_seconds": round(candidates_seconds, 4),
+            "candidates": len(candidate_ids),
+            "events_loop": len(loop_events),
+            "events_index": len(index_events),
+            "speedup": round(loop_seconds / index_seconds, 1) if index_seconds else None,
+        })
+
+    return {
+        "subscribers": count,
+        "locations": args.locations,
+        "index_build_seconds": round(build_seconds, 3),
+        "index_memory_mb": round(index_mb, 1),
+        "subscription_dicts_memory_mb": round(dicts_mb, 1),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "runs": runs,
+    }
+
+
+async def _run_sources(args) -> dict:
+    """
+    Источники данных: разбор сохраненных ответов (benchmarks/fixtures) каждым адаптером и их
+    объединение, затем опрос фейкового сервера — только WAQI против всех источников параллельно.
+    При --upstream-latency время запроса ко всем источникам должно быть близко к одному запросу.
+    """
+    from benchmarks.fakes import FakeUpstreamServer
+    from utils import sources
+    from utils.air_quality_api import get_air_quality_data
+    from utils.fusion import fuse
+
+    fixtures_dir = os.path.join(os.path.dirname(__file__), "fixtures")
+    weights = {name: source.weight for name, source in sources.SOURCES.items()}
+    observations = []
+    parsed = {}
+    for name, source in sources.SOURCES.items():
+        with open(os.path.join(fixtures_dir, f"{name}.json"), encoding="utf-8") as f:
+            found = source().parse(json.load(f), 42.8746, 74.5698)
+        parsed[name] = [{"station": o["station"], "aqi": o["aqi"]} for o in found]
+        observations.extend(found)
+    references = {name for name, source in sources.SOURCES.items() if source.reference}
+    newest = max(o["observed_at"] for o in observations)
+    fixtures = {"parsed": parsed, "fused": fuse(observations, newest + 300, weights, references)}
+
+    # Станция против согласных между собой народных датчиков (проверяется в tests/test_sources.py)
+    station = {"source": "waqi", "station": "Bishkek US Embassy", "aqi": 160, "observed_at": newest,
+               "local_time": "", "iaqi": {"PM2.5": 160}}
+    crowd = [{"source": "sensor_community", "station": f"Sensor.Community #{i}", "aqi": aqi, "observed_at": newest,
+              "local_time": "", "iaqi": {"PM2.5": aqi}} for i, aqi in enumerate((95, 100, 105, 110))]
+    fixtures["station_vs_crowd"] = fuse([station] + crowd, newest + 300, weights, references)
+
+    server = FakeUpstreamServer(seed=args.seed, latency=args.upstream_latency)
+    await server.start()
+    sources.AQICN_API_BASE_URL = server.waqi_url
+    sources.OPEN_METEO_URL = server.open_meteo_url
+    sources.SENSOR_COMMUNITY_URL = server.sensor_community_url
+    points = [(42.80 + i * 0.005, 74.55 + i * 0.004) for i in range(args.locations or 20)]
+    live = {}
+    try:
+        for label, names in (("waqi_only", ["waqi"]), ("all_sources", list(sources.SOURCES))):
+            sources._configured = [sources.SOURCES[name]() for name in names]
+            durations = []
+            aqi_delta = []
+            for latitude, longitude in points:
+                started = time.perf_counter()
+                report = await get_air_quality_data(latitude, longitude, force_refresh=True)
+                durations.append(time.perf_counter() - started)
+                aqi_delta.append(abs(report["overall_aqi"] - server.aqi_for(latitude, longitude)))
+            live[label] = {
+                "requests": len(points),
+                "mean_ms": round(sum(durations) / len(durations) * 1000, 1),
+                "max_ms": round(max(durations) * 1000, 1),
+                "mean_abs_delta_vs_station": round(sum(aqi_delta) / len(aqi_delta), 1),
+            }
+        live["upstream_calls"] = dict(server.calls)
+    finally:
+        await server.stop()
+        sources._configured = None
+    return {"fixtures": fixtures, "live": live}
+
+
+async def _run_export(args) -> dict:
+    """
+    Выгрузка года истории: районы Бишкека (в историю попадают только они), опрос раз в 30 минут.
+    Для каждого формата — время, объем и пиковая память Python (tracemalloc) при выгрузке месяца
+    и года: при потоковой выгрузке пик не должен расти с длиной периода.
+    Затем год показаний в CSV скачивается через HTTP-эндпоинт.
+    """
+    import tracemalloc
+    from benchmarks.generators import generate_readings, populate_readings
+    from database import db
+    from utils import export, metrics
+    from utils.district_index import BISHKEK_DISTRICTS
+
+    workdir = tempfile.mkdtemp(prefix="ecomonitor-bench-")
+    db.DATABASE_NAME = os.path.join(workdir, "subscriptions.db")
+    db.init_db()
+    locations = [(lat, lon, name) for name, lat, lon in BISHKEK_DISTRICTS]
+    start = export.parse_time("2024-01-01")
+    year_end = export.parse_time("2025-01-01")
+    month_end = export.parse_time("2024-02-01")
+
+    started = time.perf_counter()
+    rows = populate_readings(db.DATABASE_NAME, generate_readings(locations, start, 366, 30 * 60, args.seed))
+    populate_seconds = time.perf_counter() - started
+
+    formats = [fmt for fmt in export.FORMATS if fmt != "parquet" or export.parquet_available()]
+    results = {}
+    for kind in ("readings", "districts"):
+        for fmt in formats:
+            for period, end in (("month", month_end), ("year", year_end)):
+                started = time.perf_counter()
+                size = sum(len(chunk) for chunk in export.export(kind, fmt, start, end))
+                duration = time.perf_counter() - started
+                # Память — отдельным прогоном: tracemalloc в разы замедляет выгрузку
+                tracemalloc.start()
+                for _ in export.export(kind, fmt, start, end):
+                    pass
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                results[f"{kind}_{fmt}_{period}"] = {
+                    "seconds": round(duration, 3),
+                    "megabytes": round(size / 2 ** 20, 2),
+                    "peak_traced_mb": round(peak / 2 ** 20, 2),
+                }
+
+    # Скачивание через HTTP: сервер метрик на свободном порту, клиент читает поток и считает байты
+    export.EXPORT_TOKEN = "benchmark"
+    server = await metrics.start_metrics_server(0, host="127.0.0.1")
+    port = server.sockets[0].getsockname()[1]
+    try:
+        started = time.perf_counter()
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /export/readings?from=2024-01-01&to=2025-01-01&format=csv HTTP/1.1\r\nHost: bench\r\n"
+                     b"Authorization: Bearer benchmark\r\n\r\n")
+        await writer.drain()
+        received = 0
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            received += len(data)
+        writer.close()
+        http_seconds = time.perf_counter() - started
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    return {
+        "rows": rows,
+        "locations": len(locations),
+        "parquet_available": export.parquet_available(),
+        "populate_seconds": round(populate_seconds, 2),
+        "exports": results,
+        "http_readings_csv_year": {
+            "seconds": round(http_seconds, 3),
+            "megabytes": round(received / 2 ** 20, 2),
+            "rows_per_second": round(rows / http_seconds) if http_seconds else None,
+        },
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+async def _run_crash_recovery(args) -> dict:
+    """
+    Прерывание рассылки и продолжение после перезапуска.
+    Эталон — рассылка без прерываний. Затем та же рассылка прерывается тремя способами:
+    жесткая остановка (отмена задачи, как SIGKILL в точке ожидания) во время опроса и во время
+    отправки, и мягкая (request_stop, как SIGTERM) во время отправки. После «перезапуска»
+    (сброс состояния в памяти, прогрев кэша с диска) рассылка запускается снова.
+    Проверяется, что каждый подписчик получил ровно те уведомления, что и в эталоне, по одному разу.
+    Задержка отправки не бывает нулевой (по умолчанию 5 мс): без нее FakeBot не уступает управление
+    и отправка не прерывается. Дубликаты, пропуски или непрерванная отправка завершают бенчмарк
+    с ненулевым кодом; те же свойства проверяет tests/test_notifications.py.
+    """
+    import collections
+    import shutil
+    from benchmarks.fakes import FakeBot, FakeContext, FakeUpstreamServer
+    from benchmarks.generators import SIZES, generate_locations, populate_database
+    from database import db
+    from handlers import notifications
+    from handlers.notifications import send_aqi_notifications
+    from utils import sources
+    from utils.adaptive_polling import AdaptivePoller
+    from utils.cache import air_quality_cache
+    from utils.subscriber_index import load_subscriber_index
+
+    count = SIZES.get(args.size) or int(args.size)
+    args.locations = args.locations or 300
+    send_latency = args.send_latency or 0.005
+    workdir = tempfile.mkdtemp(prefix="ecomonitor-bench-")
+    base = os.path.join(workdir, "base.db")
+    db.DATABASE_NAME = base
+    db.init_db()
+    populate_database(base, count, generate_locations(args.locations, args.seed), args.seed)
+
+    def restart(name: str, fresh: bool) -> None:
+        if fresh:
+            shutil.copy(base, os.path.join(workdir, f"{name}.db"))
+        db.DATABASE_NAME = os.path.join(workdir, f"{name}.db")
+        notifications.poller = AdaptivePoller()
+        notifications.stop_requested = False
+        air_quality_cache._entries.clear()
+        air_quality_cache.load_from_disk()
+        load_subscriber_index()
+
+    server = FakeUpstreamServer(seed=args.seed, latency=args.upstream_latency)
+    await server.start()
+    sources.AQICN_API_BASE_URL = server.waqi_url
+    results = {"subscribers": count, "locations": args.locations, "send_latency": send_latency}
+    try:
+        restart("control", fresh=True)
+        bot = FakeBot(latency=send_latency)
+        await send_aqi_notifications(FakeContext(bot))
+        expected = collections.Counter(chat_id for chat_id, _ in bot.sent)
+        results["expected_notifications"] = len(bot.sent)
+
+        cases = (
+            ("kill_during_fetch", "waqi", server.calls["waqi"] // 2, False),
+            ("kill_during_send", "sent", len(bot.sent) // 2, False),
+            ("sigterm_during_send", "sent", len(bot.sent) // 2, True),
+        )
+        for name, trigger, threshold, graceful in cases:
+            restart(name, fresh=True)
+            bot = FakeBot(latency=send_latency)
+            calls_before = server.calls["waqi"]
+            task = asyncio.create_task(send_aqi_notifications(FakeContext(bot)))
+            while not task.done():
+                progress = server.calls["waqi"] - calls_before if trigger == "waqi" else len(bot.sent)
+                if progress >= threshold:
+                    break
+                await asyncio.sleep(0)
+            sent_before_stop = len(bot.sent)
+            started = time.perf_counter()
+            if graceful:
+                notifications.request_stop()
+                await task
+            else:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+            stop_seconds = time.perf_counter() - started
+            upstream_first = server.calls["waqi"] - calls_before
+
+            restart(name, fresh=False)
+            calls_before = server.calls["waqi"]
+            await send_aqi_notifications(FakeContext(bot))
+            delivered = collections.Counter(chat_id for chat_id, _ in bot.sent)
+            results[name] = {
+                "sent_before_stop": sent_before_stop,
+                "stop_seconds": round(stop_seconds, 4),
+                "upstream_calls_before_stop": upstream_first,
+                "upstream_calls_after_restart": server.calls["waqi"] - calls_before,
+                "delivered": len(bot.sent),
+                "duplicates": sum((delivered - expected).values()),
+                "missing": sum((expected - delivered).values()),
+            }
+    finally:
+        await server.stop()
+    failures = []
+    for name, _, _, _ in cases:
+        case = results[name]
+        if case["duplicates"] or case["missing"]:
+            failures.append(f"{name}: дубликатов {case['duplicates']}, пропущено {case['missing']}")
+        if name.endswith("_send") and not 0 < case["sent_before_stop"] < results["expected_notifications"]:
+            failures.append(f"{name}: отправка не прервана ({case['sent_before_stop']} из "
+                            f"{results['expected_notifications']})")
+    if failures:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        sys.exit("Проверка crash_recovery не пройдена:\n" + "\n".join(failures))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарки Бишкек ЭкоМонитор бота")
+    parser.add_argument("--scenario", choices=("sweep", "aqi", "import_time", "metrics_overhead", "persistence", "adaptive_polling", "subscriber_index", "sources", "export", "crash_recovery"), default="sweep")
+    parser.add_argument("--size", default="1k", help="число подписчиков: 1k, 100k, 1m или целое число")
+    parser.add_argument("--locations", type=int, help="число различных локаций (sweep и subscriber_index: 300, adaptive_polling: 20)")
+    parser.add_argument("--runs", type=int, default=2, help="число прогонов")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--upstream-latency", type=float, default=0.0, help="задержка фейкового API, с")
+    parser.add_argument("--send-latency", type=float, default=0.0,
+                        help="задержка отправки сообщения, с (crash_recovery: 0.005, если не задана)")
+    parser.add_argument("--readings", help="CSV с записанными показаниями для adaptive_polling")
+    parser.add_argument("--output", help="путь к JSON с результатами")
+    args = parser.parse_args()
+
+    # Логи на каждое уведомление искажают замеры на больших объемах
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.scenario == "sweep":
+        results = asyncio.run(_run_sweep(args))
+    elif args.scenario == "persistence":
+        results = asyncio.run(_run_persistence(args))
+    elif args.scenario == "adaptive_polling":
+        results = _run_adaptive_polling(args)
+    elif args.scenario == "crash_recovery":
+        results = asyncio.run(_run_crash_recovery(args))
+    elif args.scenario == "export":
+        results = asyncio.run(_run_export(args))
+    elif args.scenario == "sources":
+        results = asyncio.run(_run_sources(args))
+    elif args.scenario == "subscriber_index":
+        results = _run_subscriber_index(args)
+    elif args.scenario == "aqi":
+        results = _run_aqi(args)
+    elif args.scenario == "import_time":
+        results = _run_import_time(args)
+    else:
+        results = _run_metrics_overhead(args)
+
+    commit = _git_commit()
+    report = {
+        "scenario": args.scenario,
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "params": vars(args),
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}-{args.scenario}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps(report["results"], ensure_ascii=False, indent=2))
+    print(f"Результаты сохранены в {output}")
+
+
+if __name__ == "__main__":
+    main()
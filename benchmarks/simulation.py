@@ -0,0 +1,104 @@
+# benchmarks/simulation.py
+import csv
+import math
+import random
+from bisect import bisect_right
+
+from utils.adaptive_polling import SCHEDULER_TICK
+
+HOUR = 3600
+
+
+def synthetic_week(locations: int, seed: int = 42, season: str = "winter") -> dict:
+    """
+    Генерирует почасовые показания недели. Зимой: чистый день, резкий рост вечером
+    (отопление и инверсия), медленный спад к утру; интенсивность эпизодов меняется по дням.
+    Летом: чистый воздух с небольшими вечерними колебаниями.
+    Возвращает {локация: [(время, AQI), ...]}, значения меняются раз в час, как у станций WAQI.
+    """
+    rnd = random.Random(seed)
+    series = {}
+    for location in range(locations):
+        winter = season == "winter"
+        base = rnd.uniform(40, 80) if winter else rnd.uniform(15, 40)
+        offset = rnd.uniform(-1.5, 1.5)
+        daily_peaks = [rnd.uniform(60, 200) if winter else rnd.uniform(0, 25) for _ in range(7)]
+        # Станция публикует часовое значение с задержкой, которая опросу заранее неизвестна
+        publish_delay = rnd.uniform(5, 50) * 60
+        readings = []
+        for hour in range(7 * 24):
+            day, hour_of_day = divmod(hour, 24)
+            # Пик около 22:00, полуширина ~4 часа, с учетом перехода через полночь
+            distance = min(abs(hour_of_day - 22 - offset), 24 - abs(hour_of_day - 22 - offset))
+            episode = daily_peaks[day] * math.exp(-(distance / 4) ** 2)
+            aqi = max(5, round(base + episode + rnd.gauss(0, 6 if winter else 3)))
+            readings.append((hour * HOUR + publish_delay, aqi))
+        series[location] = readings
+    return series
+
+
+def load_readings(path: str) -> dict:
+    """Загружает записанные показания из CSV (timestamp,location,aqi), время сдвигается к нулю."""
+    series = {}
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            series.setdefault(row["location"], []).append((float(row["timestamp"]), int(float(row["aqi"]))))
+    start = min(t for readings in series.values() for t, _ in readings)
+    return {key: sorted((t - start, aqi) for t, aqi in readings) for key, readings in series.items()}
+
+
+def _value_at(readings: list, times: list, t: float) -> int:
+    return readings[max(bisect_right(times, t) - 1, 0)][1]
+
+
+def simulate_polling(series: dict, thresholds, fixed_interval: float | None = None, poller=None) -> dict:
+    """
+    Прогоняет опрос по показаниям с шагом SCHEDULER_TICK.
+    Возвращает число запросов и задержки обнаружения пересечения порогов снизу вверх.
+    """
+    end = max(readings[-1][0] for readings in series.values()) + HOUR
+    times_by_key = {key: [t for t, _ in readings] for key, readings in series.items()}
+    thresholds_by_key = {key: set(thresholds) for key in series}
+
+    calls = 0
+    observed = {key: [] for key in series}  # [(время опроса, AQI)]
+    last_polled = {}
+    now = 0.0
+    while now < end:
+        if poller is not None:
+            due = poller.due(thresholds_by_key, now)
+        else:
+            due = [key for key in series if key not in last_polled or now - last_polled[key] >= fixed_interval]
+        for key in due:
+            aqi = _value_at(series[key], times_by_key[key], now)
+            calls += 1
+            last_polled[key] = now
+            observed[key].append((now, aqi))
+            if poller is not None:
+                poller.record(key, aqi, now)
+        now += SCHEDULER_TICK
+
+    latencies = []
+    missed = 0
+    for key, readings in series.items():
+        polls = observed[key]
+        poll_times = [t for t, _ in polls]
+        for threshold in thresholds:
+            for (t_prev, prev), (t_cross, value) in zip(readings, readings[1:]):
+                if prev < threshold <= value:
+                    # Первый опрос после пересечения, увидевший значение не ниже порога
+                    position = bisect_right(poll_times, t_cross - 1e-9)
+                    detected = next((t for t, aqi in polls[position:] if aqi >= threshold), None)
+                    if detected is None or detected - t_cross > HOUR:
+                        missed += 1
+                    else:
+                        latencies.append(detected - t_cross)
+
+    latencies.sort()
+    return {
+        "calls": calls,
+        "crossings_detected": len(latencies),
+        "crossings_missed_or_late_over_1h": missed,
+        "mean_latency_min": round(sum(latencies) / len(latencies) / 60, 1) if latencies else None,
+        "p95_latency_min": round(latencies[int(len(latencies) * 0.95) - 1] / 60, 1) if latencies else None,
+    }
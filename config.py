@@ -7,7 +7,32 @@ load_dotenv()
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 AQICN_API_KEY = os.getenv("AQICN_API_KEY")
 
-if not TELEGRAM_BOT_TOKEN:
-    raise ValueError("TELEGRAM_BOT_TOKEN не найден в .env файле!")
-if not AQICN_API_KEY:
-    raise ValueError("AQICN_API_KEY не найден в .env файле! Данные о качестве воздуха могут быть недоступны.")
+# Лимиты запросов к AQICN: собственный суточный бюджет и документированный лимит WAQI в секунду
+AQICN_DAILY_QUOTA = int(os.getenv("AQICN_DAILY_QUOTA", "10000"))
+AQICN_PER_SECOND_LIMIT = int(os.getenv("AQICN_PER_SECOND_LIMIT", "1000"))
+
+# Источники данных о качестве воздуха через запятую: waqi, open_meteo, sensor_community
+AIR_QUALITY_SOURCES = [name.strip() for name in os.getenv("AIR_QUALITY_SOURCES", "waqi").split(",") if name.strip()]
+
+# Публичный порт веб-сервиса (Render передает PORT): на нем отвечает только проверка /healthz
+PORT = os.getenv("PORT")
+# Порт внутренних эндпоинтов /metrics и /export; задается только явно и по умолчанию слушает localhost
+METRICS_PORT = os.getenv("METRICS_PORT")
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Токен для HTTP-выгрузки истории (/export/..., заголовок Authorization: Bearer <токен>); без токена выгрузка выключена
+EXPORT_TOKEN = os.getenv("EXPORT_TOKEN")
+# TRACE_SPANS=1 включает структурированные спаны в логгере "trace"
+TRACE_SPANS = os.getenv("TRACE_SPANS") == "1"
+
+
+def validate_config() -> list[str]:
+    """
+    Проверяет конфигурацию и возвращает список ошибок (пустой, если все в порядке).
+    Не бросает исключений при импорте, чтобы модули можно было загружать без .env.
+    """
+    errors = []
+    if not TELEGRAM_BOT_TOKEN:
+        errors.append("TELEGRAM_BOT_TOKEN не найден в .env файле!")
+    if not AQICN_API_KEY:
+        errors.append("AQICN_API_KEY не найден в .env файле! Данные о качестве воздуха могут быть недоступны.")
+    return errors
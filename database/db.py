@@ -1,11 +1,67 @@
 # database/db.py
 import sqlite3
 import logging
+import time
+
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
 DATABASE_NAME = "subscriptions.db"
 
+# Колонки, добавленные после первой версии схемы: (имя, определение)
+_MIGRATION_COLUMNS = [
+    ("alert_state", "TEXT DEFAULT 'normal'"),
+    ("last_notified_at", "REAL"),
+    ("last_digest_date", "TEXT"),
+    ("timezone", "TEXT"),
+    ("quiet_start", "INTEGER"),
+    ("quiet_end", "INTEGER"),
+]
+
+_SUBSCRIPTION_FIELDS = (
+    "user_id, chat_id, latitude, longitude, location_name, aqi_threshold, last_notified_aqi, is_active, "
+    "alert_state, last_notified_at, last_digest_date, timezone, quiet_start, quiet_end"
+)
+
+
+# Слушатели изменений подписок (например, индекс подписчиков в памяти): listener(event, payload)
+_write_listeners = []
+
+
+def add_write_listener(listener) -> None:
+    """Регистрирует слушателя, вызываемого после успешной записи подписок."""
+    _write_listeners.append(listener)
+
+
+def _notify_listeners(event: str, payload) -> None:
+    for listener in _write_listeners:
+        try:
+            listener(event, payload)
+        except Exception as e:
+            logger.error(f"Ошибка в слушателе изменений подписок ({event}): {e}", exc_info=True)
+
+
+def _row_to_subscription(sub) -> dict:
+    """Преобразует строку таблицы subscriptions (в порядке _SUBSCRIPTION_FIELDS) в словарь."""
+    return {
+        "user_id": sub[0],
+        "chat_id": sub[1],
+        "latitude": sub[2],
+        "longitude": sub[3],
+        "location_name": sub[4],
+        "aqi_threshold": sub[5],
+        "last_notified_aqi": sub[6],
+        "is_active": bool(sub[7]),
+        "alert_state": sub[8],
+        "last_notified_at": sub[9],
+        "last_digest_date": sub[10],
+        "timezone": sub[11],
+        "quiet_start": sub[12],
+        "quiet_end": sub[13],
+    }
+
+@metrics.timed(metrics.db_duration, operation="init_db")
 def init_db():
     """Инициализирует базу данных, создавая таблицу подписок, если она не существует."""
     conn = sqlite3.connect(DATABASE_NAME)
@@ -22,22 +78,100 @@ def init_db():
             is_active INTEGER DEFAULT 1
         )
     """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS cache (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS persistence (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            data TEXT,
+            PRIMARY KEY (kind, key)
+        )
+    """)
+    # История показаний (локация округлена как utils.cache.location_key); только добавление
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS readings (
+            recorded_at REAL NOT NULL,
+            latitude REAL NOT NULL,
+            longitude REAL NOT NULL,
+            station TEXT,
+            aqi INTEGER NOT NULL,
+            iaqi TEXT,
+            sources TEXT
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_readings_time ON readings (recorded_at)")
+    # Контрольные точки рассылки: запуск и уведомления к отправке (outbox)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notification_runs (
+            run_id TEXT PRIMARY KEY,
+            started_at REAL NOT NULL,
+            status TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            run_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            chat_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            aqi INTEGER,
+            text TEXT NOT NULL,
+            alert_state TEXT,
+            last_notified_aqi INTEGER,
+            last_notified_at REAL,
+            last_digest_date TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            PRIMARY KEY (run_id, user_id)
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_readings_location ON readings (latitude, longitude, recorded_at)")
+    # Учет запросов к внешним API (utils/quota.py): время каждого запроса в пределах самого длинного окна
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS api_calls (
+            api TEXT NOT NULL,
+            called_at REAL NOT NULL
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_api_calls ON api_calls (api, called_at)")
+    existing_columns = {row[1] for row in cursor.execute("PRAGMA table_info(subscriptions)")}
+    for name, definition in _MIGRATION_COLUMNS:
+        if name not in existing_columns:
+            cursor.execute(f"ALTER TABLE subscriptions ADD COLUMN {name} {definition}")
+            logger.info(f"В таблицу subscriptions добавлена колонка {name}.")
     conn.commit()
     conn.close()
     logger.info("База данных инициализирована.")
 
+@metrics.timed(metrics.db_duration, operation="add_subscription")
 def add_subscription(user_id: int, chat_id: int, latitude: float, longitude: float, location_name: str, aqi_threshold: int = None):
-    """Добавляет новую подписку или обновляет существующую."""
+    """
+    Добавляет новую подписку или обновляет существующую.
+    Состояние уведомлений сбрасывается, а тихие часы и часовой пояс пользователя сохраняются.
+    """
     conn = sqlite3.connect(DATABASE_NAME)
     cursor = conn.cursor()
     try:
         cursor.execute("""
-            INSERT OR REPLACE INTO subscriptions 
+            INSERT INTO subscriptions
             (user_id, chat_id, latitude, longitude, location_name, aqi_threshold, is_active)
             VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                chat_id = excluded.chat_id, latitude = excluded.latitude, longitude = excluded.longitude,
+                location_name = excluded.location_name, aqi_threshold = excluded.aqi_threshold,
+                is_active = excluded.is_active, last_notified_aqi = NULL, alert_state = 'normal',
+                last_notified_at = NULL, last_digest_date = NULL
         """, (user_id, chat_id, latitude, longitude, location_name, aqi_threshold, 1))
         conn.commit()
         logger.info(f"Подписка для пользователя {user_id} обновлена/добавлена.")
+        _notify_listeners("upsert", (user_id, chat_id, latitude, longitude, aqi_threshold))
         return True
     except sqlite3.Error as e:
         logger.error(f"Ошибка при добавлении/обновлении подписки для {user_id}: {e}")
@@ -45,6 +179,7 @@ def add_subscription(user_id: int, chat_id: int, latitude: float, longitude: flo
     finally:
         conn.close()
 
+@metrics.timed(metrics.db_duration, operation="remove_subscription")
 def remove_subscription(user_id: int):
     """Удаляет подписку для пользователя."""
     conn = sqlite3.connect(DATABASE_NAME)
@@ -53,6 +188,7 @@ def remove_subscription(user_id: int):
         cursor.execute("DELETE FROM subscriptions WHERE user_id = ?", (user_id,))
         conn.commit()
         logger.info(f"Подписка для пользователя {user_id} удалена.")
+        _notify_listeners("remove", user_id)
         return True
     except sqlite3.Error as e:
         logger.error(f"Ошибка при удалении подписки для {user_id}: {e}")
@@ -60,60 +196,418 @@ def remove_subscription(user_id: int):
     finally:
         conn.close()
 
+@metrics.timed(metrics.db_duration, operation="get_subscription")
 def get_subscription(user_id: int):
     """Получает подписку для конкретного пользователя."""
     conn = sqlite3.connect(DATABASE_NAME)
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM subscriptions WHERE user_id = ?", (user_id,))
+    cursor.execute(f"SELECT {_SUBSCRIPTION_FIELDS} FROM subscriptions WHERE user_id = ?", (user_id,))
     sub = cursor.fetchone()
     conn.close()
     if sub:
         # Возвращаем словарь для удобства доступа
-        return {
-            "user_id": sub[0],
-            "chat_id": sub[1],
-            "latitude": sub[2],
-            "longitude": sub[3],
-            "location_name": sub[4],
-            "aqi_threshold": sub[5],
-            "last_notified_aqi": sub[6],
-            "is_active": bool(sub[7])
-        }
+        return _row_to_subscription(sub)
     return None
 
+@metrics.timed(metrics.db_duration, operation="get_all_active_subscriptions")
 def get_all_active_subscriptions():
     """Получает все активные подписки."""
     conn = sqlite3.connect(DATABASE_NAME)
     cursor = conn.cursor()
-    cursor.execute("SELECT * FROM subscriptions WHERE is_active = 1")
+    cursor.execute(f"SELECT {_SUBSCRIPTION_FIELDS} FROM subscriptions WHERE is_active = 1")
+    subscriptions = [_row_to_subscription(sub) for sub in cursor.fetchall()]
+    conn.close()
+    return subscriptions
+
+@metrics.timed(metrics.db_duration, operation="get_subscriber_columns")
+def get_subscriber_columns():
+    """
+    Возвращает компактные строки активных подписок для индекса в памяти:
+    [(user_id, chat_id, latitude, longitude, aqi_threshold, alert_state)].
+    """
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT user_id, chat_id, latitude, longitude, aqi_threshold, alert_state
+        FROM subscriptions WHERE is_active = 1
+    """)
+    rows = cursor.fetchall()
+    conn.close()
+    return rows
+
+@metrics.timed(metrics.db_duration, operation="get_subscriptions_by_ids")
+def get_subscriptions_by_ids(user_ids) -> list[dict]:
+    """Получает активные подписки по списку user_id (запросы выполняются порциями)."""
+    user_ids = list(user_ids)
     subscriptions = []
-    for sub in cursor.fetchall():
-        subscriptions.append({
-            "user_id": sub[0],
-            "chat_id": sub[1],
-            "latitude": sub[2],
-            "longitude": sub[3],
-            "location_name": sub[4],
-            "aqi_threshold": sub[5],
-            "last_notified_aqi": sub[6],
-            "is_active": bool(sub[7])
-        })
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    for start in range(0, len(user_ids), 500):
+        chunk = user_ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(
+            f"SELECT {_SUBSCRIPTION_FIELDS} FROM subscriptions WHERE is_active = 1 AND user_id IN ({placeholders})",
+            chunk
+        )
+        subscriptions.extend(_row_to_subscription(sub) for sub in cursor.fetchall())
     conn.close()
     return subscriptions
 
-def update_last_notified_aqi(user_id: int, aqi: int):
-    """Обновляет последний известный AQI, о котором было уведомлено."""
+@metrics.timed(metrics.db_duration, operation="set_quiet_hours")
+def set_quiet_hours(user_id: int, quiet_start: int | None, quiet_end: int | None, timezone: str | None):
+    """
+    Сохраняет тихие часы (локальные часы начала и окончания) и часовой пояс подписки.
+    None — значение по умолчанию (utils/alerts.py). Возвращает False, если подписки нет.
+    """
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "UPDATE subscriptions SET quiet_start = ?, quiet_end = ?, timezone = ? WHERE user_id = ?",
+            (quiet_start, quiet_end, timezone, user_id)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при сохранении тихих часов для {user_id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="start_notification_run")
+def start_notification_run(run_id: str, started_at: float):
+    """Регистрирует новый запуск рассылки (статус fetching — идет опрос локаций)."""
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO notification_runs (run_id, started_at, status) VALUES (?, ?, 'fetching')",
+            (run_id, started_at)
+        )
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при регистрации запуска рассылки {run_id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="get_unfinished_notification_run")
+def get_unfinished_notification_run():
+    """Возвращает последний незавершенный запуск рассылки (run_id, started_at, status) или None."""
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT run_id, started_at, status FROM notification_runs
+            WHERE status IN ('fetching', 'sending') ORDER BY started_at DESC LIMIT 1
+        """)
+        return cursor.fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при поиске незавершенной рассылки: {e}")
+        return None
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="save_notification_outbox")
+def save_notification_outbox(run_id: str, entries: list[tuple]):
+    """
+    Сохраняет уведомления запуска одной транзакцией и переводит запуск в статус sending.
+    entries — [(user_id, chat_id, event, aqi, text, alert_state, last_notified_aqi, last_notified_at, last_digest_date)],
+    где последние четыре поля — состояние подписки после отправки.
+    """
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.executemany("""
+            INSERT OR REPLACE INTO notification_outbox
+            (run_id, user_id, chat_id, event, aqi, text, alert_state, last_notified_aqi, last_notified_at, last_digest_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(run_id,) + tuple(entry) for entry in entries])
+        cursor.execute("UPDATE notification_runs SET status = 'sending' WHERE run_id = ?", (run_id,))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при сохранении уведомлений запуска {run_id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="get_pending_notifications")
+def get_pending_notifications(run_id: str) -> list[dict]:
+    """Неотправленные уведомления запуска для активных подписок."""
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT o.user_id, o.chat_id, o.event, o.aqi, o.text,
+                   o.alert_state, o.last_notified_aqi, o.last_notified_at, o.last_digest_date
+            FROM notification_outbox o
+            JOIN subscriptions s ON s.user_id = o.user_id AND s.is_active = 1
+            WHERE o.run_id = ? AND o.status = 'pending'
+            ORDER BY o.rowid
+        """, (run_id,))
+        return [
+            {"user_id": row[0], "chat_id": row[1], "event": row[2], "aqi": row[3], "text": row[4],
+             "state_update": (row[5], row[6], row[7], row[8], row[0])}
+            for row in cursor.fetchall()
+        ]
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при загрузке уведомлений запуска {run_id}: {e}")
+        return []
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="complete_notification")
+def complete_notification(run_id: str, user_id: int, status: str, state_update: tuple | None = None):
+    """
+    Отмечает уведомление как отправленное (sent) или неудачное (failed) и в той же транзакции
+    обновляет состояние подписки.
+    state_update — кортеж (alert_state, last_notified_aqi, last_notified_at, last_digest_date, user_id);
+    None в last_digest_date оставляет прежнее значение.
+    """
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        if state_update is not None:
+            cursor.execute("""
+                UPDATE subscriptions
+                SET alert_state = ?, last_notified_aqi = ?, last_notified_at = ?,
+                    last_digest_date = COALESCE(?, last_digest_date)
+                WHERE user_id = ?
+            """, state_update)
+        cursor.execute(
+            "UPDATE notification_outbox SET status = ? WHERE run_id = ? AND user_id = ?",
+            (status, run_id, user_id)
+        )
+        conn.commit()
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при сохранении результата отправки для {user_id}: {e}")
+        return False
+    finally:
+        conn.close()
+    if state_update is not None:
+        _notify_listeners("states", [state_update])
+    return True
+
+@metrics.timed(metrics.db_duration, operation="finish_notification_run")
+def finish_notification_run(run_id: str, status: str = "done"):
+    """Завершает запуск рассылки: меняет статус и удаляет его outbox и записи запусков старше недели."""
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("UPDATE notification_runs SET status = ? WHERE run_id = ?", (status, run_id))
+        cursor.execute("DELETE FROM notification_outbox WHERE run_id = ?", (run_id,))
+        cursor.execute(
+            "DELETE FROM notification_runs WHERE status NOT IN ('fetching', 'sending') AND started_at < ?",
+            (time.time() - 7 * 24 * 60 * 60,)
+        )
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при завершении запуска рассылки {run_id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="save_cache_entry")
+def save_cache_entry(namespace: str, key: str, value: str, updated_at: float):
+    """Сохраняет запись кэша (значение в виде JSON-строки)."""
     conn = sqlite3.connect(DATABASE_NAME)
     cursor = conn.cursor()
     try:
-        cursor.execute("UPDATE subscriptions SET last_notified_aqi = ? WHERE user_id = ?", (aqi, user_id))
+        cursor.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, value, updated_at)
+        )
         conn.commit()
         return True
     except sqlite3.Error as e:
-        logger.error(f"Ошибка при обновлении last_notified_aqi для {user_id}: {e}")
+        logger.error(f"Ошибка при сохранении записи кэша {namespace}/{key}: {e}")
         return False
     finally:
         conn.close()
 
+@metrics.timed(metrics.db_duration, operation="load_cache_entries")
+def load_cache_entries(namespace: str, min_updated_at: float = 0):
+    """Возвращает записи кэша [(key, value, updated_at)], обновленные не раньше min_updated_at, от старых к новым."""
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT key, value, updated_at FROM cache WHERE namespace = ? AND updated_at >= ? ORDER BY updated_at",
+            (namespace, min_updated_at)
+        )
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при загрузке кэша {namespace}: {e}")
+        return []
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="purge_cache_entries")
+def purge_cache_entries(namespace: str, older_than: float):
+    """Удаляет устаревшие записи кэша."""
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM cache WHERE namespace = ? AND updated_at < ?", (namespace, older_than))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при очистке кэша {namespace}: {e}")
+        return False
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="save_api_call")
+def save_api_call(api: str, called_at: float, keep_after: float):
+    """Записывает запрос к API и удаляет записи, вышедшие за пределы окна учета (не позже keep_after)."""
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("INSERT INTO api_calls (api, called_at) VALUES (?, ?)", (api, called_at))
+        cursor.execute("DELETE FROM api_calls WHERE api = ? AND called_at <= ?", (api, keep_after))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при сохранении запроса к API {api}: {e}")
+        return False
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="load_api_calls")
+def load_api_calls(api: str, min_called_at: float) -> list[float]:
+    """Возвращает время запросов к API позже min_called_at по возрастанию."""
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT called_at FROM api_calls WHERE api = ? AND called_at > ? ORDER BY called_at",
+            (api, min_called_at)
+        )
+        return [row[0] for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при загрузке учета запросов к API {api}: {e}")
+        return []
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="load_persistence")
+def load_persistence(kind: str):
+    """Возвращает сохраненные данные бота заданного вида [(key, data)] (data — JSON-строка)."""
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT key, data FROM persistence WHERE kind = ?", (kind,))
+        return cursor.fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при загрузке сохраненных данных {kind}: {e}")
+        return []
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="save_persistence_batch")
+def save_persistence_batch(upserts: list[tuple], deletes: list[tuple]):
+    """
+    Записывает пакет изменений одной транзакцией.
+    upserts — [(kind, key, data)], deletes — [(kind, key)].
+    """
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        if upserts:
+            cursor.executemany("INSERT OR REPLACE INTO persistence (kind, key, data) VALUES (?, ?, ?)", upserts)
+        if deletes:
+            cursor.executemany("DELETE FROM persistence WHERE kind = ? AND key = ?", deletes)
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при сохранении данных бота: {e}")
+        return False
+    finally:
+        conn.close()
+
+@metrics.timed(metrics.db_duration, operation="save_reading")
+def save_reading(recorded_at: float, latitude: float, longitude: float, station: str, aqi: int,
+                 iaqi: str | None = None, sources: str | None = None):
+    """Добавляет показание в историю (iaqi — JSON-строка, sources — имена источников через запятую)."""
+    conn = sqlite3.connect(DATABASE_NAME)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "INSERT INTO readings (recorded_at, latitude, longitude, station, aqi, iaqi, sources) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (recorded_at, latitude, longitude, station, aqi, iaqi, sources)
+        )
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при сохранении показания для {latitude}, {longitude}: {e}")
+        return False
+    finally:
+        conn.close()
+
+def _connect_read_only():
+    # Генераторы выгрузки могут продолжаться в другом потоке (asyncio.to_thread), но не параллельно
+    return sqlite3.connect(f"file:{DATABASE_NAME}?mode=ro", uri=True, check_same_thread=False)
+
+def _iter_query(query: str, params: tuple, batch_size: int):
+    """
+    Выполняет запрос на чтение и отдает строки порциями по batch_size (память не зависит от объема).
+    Ошибка чтения пробрасывается после записи в лог: иначе оборванная выгрузка выглядела бы полной.
+    """
+    conn = _connect_read_only()
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка при чтении истории показаний: {e}")
+        raise
+    finally:
+        conn.close()
+
+def iter_readings(start: float, end: float, locations: list[tuple[float, float]], batch_size: int = 1000):
+    """
+    Генератор показаний за период [start, end) в порядке времени:
+    (recorded_at, latitude, longitude, station, aqi, iaqi, sources).
+    locations — округленные координаты точек (utils.cache.location_key); другие точки не выбираются.
+    """
+    if not locations:
+        return iter(())
+    placeholders = ",".join("(?, ?)" for _ in locations)
+    query = f"""
+        SELECT recorded_at, latitude, longitude, station, aqi, iaqi, sources FROM readings
+        WHERE recorded_at >= ? AND recorded_at < ? AND (latitude, longitude) IN (VALUES {placeholders})
+        ORDER BY recorded_at
+    """
+    params = (start, end) + tuple(value for location in locations for value in location)
+    return _iter_query(query, params, batch_size)
+
+def iter_daily_stats(start: float, end: float, locations: list[tuple[float, float]],
+                     utc_offset: int = 0, batch_size: int = 1000):
+    """
+    Генератор суточной статистики по точкам за период [start, end):
+    (день, latitude, longitude, число показаний, мин. AQI, средний AQI, макс. AQI).
+    Сутки считаются в локальном времени со смещением utc_offset секунд.
+    """
+    if not locations:
+        return iter(())
+    placeholders = ",".join("(?, ?)" for _ in locations)
+    query = f"""
+        SELECT date(recorded_at + ?, 'unixepoch') AS day, latitude, longitude,
+               COUNT(*), MIN(aqi), ROUND(AVG(aqi), 1), MAX(aqi)
+        FROM readings
+        WHERE recorded_at >= ? AND recorded_at < ? AND (latitude, longitude) IN (VALUES {placeholders})
+        GROUP BY day, latitude, longitude
+        ORDER BY day, latitude, longitude
+    """
+    params = (utc_offset, start, end) + tuple(value for location in locations for value in location)
+    return _iter_query(query, params, batch_size)
+
 if __name__ == "__main__":
     init_db()
@@ -0,0 +1,163 @@
+# database/persistence.py
+import asyncio
+import json
+import logging
+import time
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from database import db
+
+logger = logging.getLogger(__name__)
+
+# Виды данных в таблице persistence
+KIND_USER = "user"
+KIND_CHAT = "chat"
+KIND_BOT = "bot"
+KIND_CONVERSATION = "conversation"
+
+# Отложенная запись: изменения копятся в памяти и пишутся одной транзакцией
+# не реже, чем раз в FLUSH_INTERVAL секунд, или сразу после FLUSH_EVERY изменений.
+FLUSH_INTERVAL = 10
+FLUSH_EVERY = 200
+
+
+def _dumps(value) -> str:
+    # Без default=str: несериализуемое значение должно быть ошибкой, а не молча превратиться в строку
+    return json.dumps(value, ensure_ascii=False)
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Хранение user_data, chat_data, bot_data и состояний ConversationHandler в той же SQLite БД,
+    что и подписки, чтобы перезапуск не обрывал диалоги пользователей.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL, flush_every: int = FLUSH_EVERY,
+                 update_interval: float = 5):
+        # update_interval — как часто Application передает накопленные изменения в persistence;
+        # в БД они попадают уже по правилам отложенной записи.
+        super().__init__(store_data=PersistenceInput(callback_data=False), update_interval=update_interval)
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self._user_data = None
+        self._chat_data = None
+        self._bot_data = None
+        self._conversations = None
+        self._pending = {}  # (kind, key) -> JSON-строка или None для удаления
+        self._flush_handle = None
+        self.flushes = 0
+
+    # --- Загрузка ---
+    def _load_conversations(self) -> dict:
+        if self._conversations is None:
+            self._conversations = {}
+            for key, data in db.load_persistence(KIND_CONVERSATION):
+                name, _, conversation_key = key.partition("|")
+                self._conversations.setdefault(name, {})[tuple(json.loads(conversation_key))] = json.loads(data)
+        return self._conversations
+
+    @staticmethod
+    def _load_by_id(kind: str) -> dict:
+        return {int(key): json.loads(data) for key, data in db.load_persistence(kind)}
+
+    async def get_user_data(self) -> dict:
+        if self._user_data is None:
+            self._user_data = self._load_by_id(KIND_USER)
+        return self._user_data
+
+    async def get_chat_data(self) -> dict:
+        if self._chat_data is None:
+            self._chat_data = self._load_by_id(KIND_CHAT)
+        return self._chat_data
+
+    async def get_bot_data(self) -> dict:
+        if self._bot_data is None:
+            rows = db.load_persistence(KIND_BOT)
+            self._bot_data = json.loads(rows[0][1]) if rows else {}
+        return self._bot_data
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return dict(self._load_conversations().get(name, {}))
+
+    # --- Изменения (попадают в буфер отложенной записи) ---
+    def _stage(self, kind: str, key: str, data) -> None:
+        try:
+            self._pending[(kind, key)] = None if data is None else _dumps(data)
+        except (TypeError, ValueError) as e:
+            # В persistence допускаются только JSON-совместимые значения; остальные данные пишутся как обычно
+            logger.error(f"Данные {kind}/{key} не сохранены: значение несовместимо с JSON ({e}).")
+            return
+        if len(self._pending) >= self.flush_every:
+            self._write_pending()
+        elif self._flush_handle is None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._flush_handle = loop.call_later(self.flush_interval, self._write_pending)
+
+    def _write_pending(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        upserts = [(kind, key, data) for (kind, key), data in pending.items() if data is not None]
+        deletes = [(kind, key) for (kind, key), data in pending.items() if data is None]
+        started = time.perf_counter()
+        if db.save_persistence_batch(upserts, deletes):
+            self.flushes += 1
+            logger.debug(f"Сохранено {len(pending)} изменений за {(time.perf_counter() - started) * 1000:.1f} мс.")
+        else:
+            # Не теряем изменения: вернем их в буфер, если за это время не пришли более новые
+            for item, data in pending.items():
+                self._pending.setdefault(item, data)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._stage(KIND_USER, str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._stage(KIND_CHAT, str(chat_id), data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        self._bot_data = data
+        self._stage(KIND_BOT, "bot", data)
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        conversations = self._load_conversations().setdefault(name, {})
+        if new_state is None:
+            conversations.pop(key, None)
+        else:
+            conversations[key] = new_state
+        self._stage(KIND_CONVERSATION, f"{name}|{_dumps(list(key))}", new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if self._user_data is not None:
+            self._user_data.pop(user_id, None)
+        self._stage(KIND_USER, str(user_id), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        if self._chat_data is not None:
+            self._chat_data.pop(chat_id, None)
+        self._stage(KIND_CHAT, str(chat_id), None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Вызывается при остановке приложения: записывает все накопленные изменения."""
+        self._write_pending()
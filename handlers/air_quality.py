@@ -4,6 +4,8 @@ from telegram.ext import ContextTypes, ConversationHandler
 from utils.air_quality_api import get_air_quality_data
 from utils.geo_utils import geocode_address
 from utils.markdown_helpers import escape_markdown_v2
+from utils.aqi import get_aqi_category, get_basic_recommendations
+from utils.batch_lookup import split_locations, lookup_many, MAX_BATCH_LOCATIONS
 from handlers.start import start_command # Импортируем start_command для возврата основного меню
 import logging
 
@@ -57,6 +59,14 @@ async def handle_location_input(update: Update, context: ContextTypes.DEFAULT_TY
         await update.message.reply_text(escape_markdown_v2(f"Получена ваша геопозиция. {location_name}."), parse_mode='MarkdownV2')
     elif update.message.text:
         input_location = update.message.text
+
+        # Несколько мест в одном сообщении ("Джал, Восток-5, Асанбай") — отвечаем одной таблицей
+        names = split_locations(input_location)
+        if len(names) > 1:
+            await _send_batch_report(update, names)
+            await start_command(update, context)
+            return ConversationHandler.END
+
         # Применяем escape_markdown_v2 к тексту
         await update.message.reply_text(escape_markdown_v2(f"Ищу данные для '{input_location}'..."), parse_mode='MarkdownV2')
 
@@ -171,7 +181,7 @@ async def _send_air_quality_report(update: Update, context: ContextTypes.DEFAULT
         report_text = f"**Качество воздуха  **:\n"
 
         overall_aqi = air_data['overall_aqi']
-        category, emoji = _get_aqi_category(overall_aqi)
+        category, emoji = get_aqi_category(overall_aqi)
         
         report_text += f"**Общий AQI**: `{escape_markdown_v2(str(overall_aqi))}` {emoji} \\({escape_markdown_v2(category)}\\)\n"
 
@@ -183,7 +193,7 @@ async def _send_air_quality_report(update: Update, context: ContextTypes.DEFAULT
                 report_text += f"  • **{escape_markdown_v2(pollutant)}**: `{escape_markdown_v2(str(value))}` \\({escape_markdown_v2(description)}\\)\n" # Добавляем описание
 
         report_text += "\n"
-        report_text += escape_markdown_v2(_get_basic_recommendations(overall_aqi))
+        report_text += escape_markdown_v2(get_basic_recommendations(overall_aqi))
         
         report_text += "\n"
 
@@ -208,6 +218,36 @@ async def _send_air_quality_report(update: Update, context: ContextTypes.DEFAULT
             )
             
             
+async def _send_batch_report(update: Update, names: list[str]) -> None:
+    """Отправляет сравнительную таблицу AQI для нескольких мест, отсортированную по AQI."""
+    if len(names) > MAX_BATCH_LOCATIONS:
+        await update.message.reply_text(
+            escape_markdown_v2(f"Можно сравнить не больше {MAX_BATCH_LOCATIONS} мест за раз, покажу первые {MAX_BATCH_LOCATIONS}."),
+            parse_mode='MarkdownV2'
+        )
+    await update.message.reply_text(escape_markdown_v2(f"Ищу данные для {len(names[:MAX_BATCH_LOCATIONS])} мест..."), parse_mode='MarkdownV2')
+
+    rows = await lookup_many(names)
+
+    lines = []
+    for row in rows:
+        # Внутри блока кода MarkdownV2 экранируются только ` и \
+        name = row['name'].replace("\\", "\\\\").replace("`", "'")
+        if row['aqi'] is None:
+            status = "не найдено" if row['address'] is None else "нет данных"
+            lines.append(f"❔    —  {name} ({status})")
+        else:
+            _, emoji = get_aqi_category(row['aqi'])
+            lines.append(f"{emoji} {row['aqi']:>4}  {name}")
+
+    report_text = (
+        "📊 *Сравнение качества воздуха*\n\n"
+        "```\n" + "\n".join(lines) + "\n```\n"
+        + escape_markdown_v2("Для подробностей по одному месту введите его название отдельно.")
+    )
+    await update.message.reply_text(report_text, parse_mode='MarkdownV2')
+
+
 def _get_pollutant_description(pollutant: str) -> str:
     """Возвращает краткое описание загрязнителя."""
     descriptions = {
@@ -223,34 +263,3 @@ def _get_pollutant_description(pollutant: str) -> str:
     }
     # Приводим pollutant к нижнему регистру для соответствия ключам словаря
     return descriptions.get(pollutant.lower(), "информация отсутствует")
-
-
-def _get_aqi_category(aqi: int) -> tuple[str, str]:
-    """Возвращает категорию и эмодзи для AQI."""
-    if aqi <= 50:
-        return "Хорошо", "🟢"
-    elif aqi <= 100:
-        return "Умеренно", "🟡"
-    elif aqi <= 150:
-        return "Неблагоприятно для чувствительных групп", "🟠"
-    elif aqi <= 200:
-        return "Неблагоприятно", "🔴"
-    elif aqi <= 300:
-        return "Очень неблагоприятно", "🟣"
-    else:
-        return "Опасно", "🟤"
-
-def _get_basic_recommendations(aqi: int) -> str:
-    """Возвращает базовые рекомендации на основе AQI."""
-    if aqi <= 50:
-        return "Качество воздуха хорошее. Наслаждайтесь активностями на свежем воздухе!"
-    elif aqi <= 100:
-        return "Качество воздуха умеренное. Чувствительным людям стоит ограничить длительные нагрузки на улице."
-    elif aqi <= 150:
-        return "Неблагоприятно для чувствительных групп. Людям с заболеваниями дыхания и сердца, детям и пожилым следует сократить время на улице."
-    elif aqi <= 200:
-        return "Качество воздуха неблагоприятное. Избегайте длительного нахождения на улице, особенно при физических нагрузках. Закройте окна."
-    elif aqi <= 300:
-        return "Очень неблагоприятное. Старайтесь оставаться дома, используйте очистители воздуха. На улице используйте респираторы."
-    else:
-        return "Качество воздуха опасно! Максимально сократите время нахождения на улице. Используйте защиту органов дыхания. Закройте окна, включите очистители."
@@ -0,0 +1,36 @@
+# handlers/inline.py
+from telegram import Update, InlineQueryResultArticle, InputTextMessageContent
+from telegram.ext import ContextTypes
+from utils.district_index import district_index, describe
+from utils.markdown_helpers import escape_markdown_v2
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Telegram кэширует ответы на одинаковые инлайн-запросы на своей стороне
+INLINE_CACHE_TIME = 300
+MAX_INLINE_RESULTS = 10
+
+
+async def inline_aqi_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Отвечает на инлайн-запрос "@bot Джал" данными из индекса районов.
+    Запросы приходят на каждое нажатие клавиши, поэтому внешние API здесь не вызываются.
+    """
+    query = update.inline_query
+    districts = district_index.search(query.query, limit=MAX_INLINE_RESULTS)
+
+    results = []
+    for i, district in enumerate(districts):
+        description = describe(district)
+        text = f"*{escape_markdown_v2(district['name'])}*: {escape_markdown_v2(description)}"
+        if district["time"]:
+            text += f"\n📅 Время данных: `{escape_markdown_v2(district['time'])}`"
+        results.append(InlineQueryResultArticle(
+            id=str(i),
+            title=district["name"],
+            description=description,
+            input_message_content=InputTextMessageContent(text, parse_mode='MarkdownV2'),
+        ))
+
+    await query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False)
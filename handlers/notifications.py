@@ -0,0 +1,176 @@
+# handlers/notifications.py
+import logging
+import time
+import uuid
+
+from telegram.ext import ContextTypes
+
+from database import db
+from utils.air_quality_api import get_air_quality_data
+from utils.markdown_helpers import escape_markdown_v2
+from utils.aqi import get_aqi_category
+from utils import alerts
+from utils import metrics
+from utils.adaptive_polling import AdaptivePoller, MIN_POLL_INTERVAL
+from utils.cache import air_quality_cache, air_quality_key
+from utils.quota import waqi_quota
+from utils.subscriber_index import subscriber_index, load_subscriber_index
+
+logger = logging.getLogger(__name__)
+
+# Общий для всех запусков рассылки планировщик опроса локаций
+poller = AdaptivePoller(quota=waqi_quota)
+
+# Прерванная рассылка продолжается после перезапуска, если прошло не больше этого времени;
+# более старые уведомления уже неактуальны, и события оцениваются заново
+RESUME_MAX_AGE = 60 * 60
+# Устанавливается при остановке бота (SIGTERM/SIGINT): новые отправки не начинаются
+stop_requested = False
+
+_EVENT_TITLES = {
+    alerts.EVENT_ENTERED: "🔔 *Уведомление о качестве воздуха*",
+    alerts.EVENT_ESCALATED: "⚠️ *Качество воздуха ухудшилось*",
+    alerts.EVENT_RECOVERED: "✅ *Качество воздуха улучшилось*",
+    alerts.EVENT_DIGEST: "📰 *Ежедневная сводка о качестве воздуха*",
+}
+
+
+def _build_notification_text(event: str, location_name: str, current_aqi: int, air_data: dict) -> str:
+    category, emoji = get_aqi_category(current_aqi)
+    return (
+        f"{_EVENT_TITLES[event]}\n\n"
+        f"**Локация:** {escape_markdown_v2(location_name)}\n"
+        f"**Текущий AQI:** `{escape_markdown_v2(str(current_aqi))}` {emoji} \\({escape_markdown_v2(category)}\\)\n"
+        f"📅 Время данных: `{escape_markdown_v2(air_data.get('local_time', 'неизвестно'))}`\n\n"
+        "ℹ️ Для подробной информации используйте /airquality"
+    )
+
+
+async def _deliver(context: ContextTypes.DEFAULT_TYPE, run_id: str) -> bool:
+    """
+    Отправляет неотправленные уведомления запуска. После каждой отправки результат и новое
+    состояние подписки записываются одной транзакцией, поэтому после перезапуска уведомление
+    не будет отправлено повторно. Возвращает False, если отправка прервана остановкой бота.
+    """
+    pending = db.get_pending_notifications(run_id)
+    for position, notification in enumerate(pending):
+        if stop_requested:
+            logger.info(f"Остановка бота: {len(pending) - position} уведомлений запуска {run_id} "
+                        "будут отправлены после перезапуска.")
+            return False
+        user_id = notification['user_id']
+        try:
+            await context.bot.send_message(
+                chat_id=notification['chat_id'],
+                text=notification['text'],
+                parse_mode='MarkdownV2'
+            )
+        except Exception as e:
+            logger.error(f"Ошибка при отправке уведомления для пользователя {user_id}: {e}", exc_info=True)
+            # Состояние подписки не меняется: событие будет оценено заново при следующей рассылке
+            db.complete_notification(run_id, user_id, "failed")
+            continue
+
+        db.complete_notification(run_id, user_id, "sent", notification['state_update'])
+        metrics.notifications_sent_total.inc(event=notification['event'])
+        logger.info(f"Уведомление ({notification['event']}) отправлено пользователю {user_id} "
+                    f"(AQI: {notification['aqi']}).")
+
+    db.finish_notification_run(run_id)
+    return True
+
+
+def request_stop() -> None:
+    """Просит текущую рассылку остановиться после отправки, которая уже выполняется."""
+    global stop_requested
+    stop_requested = True
+
+
+@metrics.timed(metrics.sweep_duration)
+async def send_aqi_notifications(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Фоновое задание для отправки уведомлений о качестве воздуха.
+    Каждый запуск сохраняет контрольные точки (notification_runs, notification_outbox):
+    прерванный запуск продолжается при следующем вызове, в том числе после перезапуска бота.
+    """
+    logger.info("Запуск задачи по рассылке уведомлений о качестве воздуха.")
+    if stop_requested:
+        return
+
+    now = time.time()
+    unfinished = db.get_unfinished_notification_run()
+    if unfinished is not None:
+        run_id, started_at, status = unfinished
+        if now - started_at > RESUME_MAX_AGE:
+            logger.warning(f"Прерванная рассылка {run_id} устарела и не будет продолжена.")
+            db.finish_notification_run(run_id, "expired")
+        elif status == "sending":
+            logger.info(f"Продолжение прерванной рассылки {run_id}.")
+            if not await _deliver(context, run_id):
+                return
+        else:
+            logger.info(f"Прерванная рассылка {run_id} не дошла до отправки, опрос продолжается.")
+            db.finish_notification_run(run_id, "abandoned")
+
+    now = time.time()
+    if not subscriber_index.loaded:
+        load_subscriber_index()
+    metrics.active_subscriptions.set(len(subscriber_index))
+    if not len(subscriber_index):
+        logger.info("Нет активных подписок для рассылки.")
+        return
+
+    run_id = uuid.uuid4().hex
+    db.start_notification_run(run_id, now)
+
+    # Данные запрашиваются один раз для каждой локации, а не для каждого подписчика,
+    # и только для тех локаций, которые адаптивный планировщик считает пора обновить
+    locations = subscriber_index.locations()
+    thresholds_by_key = subscriber_index.thresholds_by_key()
+
+    due_keys = poller.due(thresholds_by_key, now)
+    logger.info(f"Опрос {len(due_keys)} из {len(locations)} локаций.")
+
+    air_data_by_key = {}
+    for key in due_keys:
+        if stop_requested:
+            # Запуск остается в статусе fetching; полученные показания уже сохранены в кэше
+            return
+        latitude, longitude = locations[key]
+        air_data = None
+        if not poller.has_readings(key):
+            # Первый опрос после перезапуска: планировщик считает пора обновить все локации, а показание
+            # моложе MIN_POLL_INTERVAL (прогрев при старте, прерванный запуск) уже есть в кэше.
+            # При плановом опросе кэш не используется: запись предыдущего опроса всегда чуть моложе интервала
+            air_data = air_quality_cache.get(air_quality_key(latitude, longitude), max_age=MIN_POLL_INTERVAL)
+        if air_data is None:
+            air_data = await get_air_quality_data(latitude, longitude, force_refresh=True)
+        if not air_data or not isinstance(air_data.get('overall_aqi'), (int, float)):
+            logger.warning(f"Не удалось получить AQI для локации {latitude}, {longitude}.")
+            continue
+        air_data_by_key[key] = air_data
+        poller.record(key, air_data['overall_aqi'], now)
+
+    readings = {key: data['overall_aqi'] for key, data in air_data_by_key.items()}
+    # Из БД загружаются только подписки, для которых показание может вызвать событие
+    candidate_ids = []
+    for key, aqi in readings.items():
+        candidate_ids.extend(subscriber_index.candidates(key, aqi))
+    subscriptions = db.get_subscriptions_by_ids(candidate_ids) if candidate_ids else []
+    logger.info(f"Проверка {len(subscriptions)} из {len(subscriber_index)} подписок.")
+
+    outbox = []
+    for sub, event, current_aqi in alerts.evaluate_subscriptions(subscriptions, readings, now):
+        air_data = air_data_by_key[alerts.location_key(sub['latitude'], sub['longitude'])]
+        if event == alerts.EVENT_DIGEST:
+            # Сводка не влияет на интервалы между тревожными уведомлениями
+            digest_date = alerts.local_time(now, sub['timezone']).date().isoformat()
+            state = (sub['alert_state'], sub['last_notified_aqi'], sub['last_notified_at'], digest_date)
+        else:
+            state = (alerts.next_state(sub, event), current_aqi, now, None)
+        text = _build_notification_text(event, sub['location_name'], current_aqi, air_data)
+        outbox.append((sub['user_id'], sub['chat_id'], event, current_aqi, text) + state)
+
+    # Контрольная точка: после нее запуск можно продолжить с места остановки
+    db.save_notification_outbox(run_id, outbox)
+    await _deliver(context, run_id)
@@ -8,7 +8,10 @@ from database import db
 from utils.air_quality_api import get_air_quality_data
 from utils.geo_utils import geocode_address
 from utils.markdown_helpers import escape_markdown_v2
+from utils.aqi import get_aqi_category
+from utils.alerts import DEFAULT_QUIET_END, DEFAULT_QUIET_START, DEFAULT_TIMEZONE, MAX_AQI_THRESHOLD
 
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import logging
 
 logger = logging.getLogger(__name__)
@@ -63,7 +66,7 @@ async def handle_sub_location(update: Update, context: ContextTypes.DEFAULT_TYPE
 
         if current_air_data and current_air_data.get("overall_aqi") is not None:
             current_aqi = current_air_data["overall_aqi"]
-            category, emoji = _get_aqi_category(current_aqi)
+            category, emoji = get_aqi_category(current_aqi)
             await update.message.reply_text(
                 f"📊 AQI в {escape_markdown_v2(location_name)}: *{current_aqi}* ({category} {emoji})\n"
                 "💬 Укажите значение AQI, при превышении которого вы хотите получать уведомления.\n"
@@ -82,10 +85,12 @@ async def handle_sub_location(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def handle_sub_threshold(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     try:
         aqi_threshold = int(update.message.text)
-        if aqi_threshold < 0:
+        if not 0 <= aqi_threshold <= MAX_AQI_THRESHOLD:
             raise ValueError
     except ValueError:
-        await update.message.reply_text("🚫 Введите корректное число (например, 100) или 0.")
+        await update.message.reply_text(
+            f"🚫 Введите число от 0 до {MAX_AQI_THRESHOLD} (например, 100) или 0 для всех существенных изменений."
+        )
         return GET_SUB_THRESHOLD
 
     user_id = update.effective_user.id
@@ -130,22 +135,73 @@ async def my_subscriptions_command(update: Update, context: ContextTypes.DEFAULT
         )
         if subscription['aqi_threshold'] == 0:
             text += " (все существенные изменения)"
+        text += f"\n🌙 Тихие часы: *{escape_markdown_v2(_describe_quiet_hours(subscription))}*"
 
         await update.message.reply_text(text, parse_mode=ParseMode.MARKDOWN_V2)
     else:
         await update.message.reply_text("ℹ️ У вас нет активных подписок. Используйте /subscribe.")
 
-# ---------- Категории AQI ----------
-def _get_aqi_category(aqi: int) -> tuple[str, str]:
-    if aqi <= 50:
-        return "Хорошо", "🟢"
-    elif aqi <= 100:
-        return "Умеренно", "🟡"
-    elif aqi <= 150:
-        return "Неблагоприятно для чувствительных групп", "🟠"
-    elif aqi <= 200:
-        return "Неблагоприятно", "🔴"
-    elif aqi <= 300:
-        return "Очень неблагоприятно", "🟣"
+# ---------- Команда /quiet ----------
+QUIET_USAGE = (
+    "🌙 Тихие часы — время, когда уведомления откладываются (кроме опасного AQI от 301).\n\n"
+    "/quiet 23 7 — с 23:00 до 07:00\n"
+    "/quiet 22 6 Europe/Moscow — с часовым поясом\n"
+    "/quiet off — без тихих часов\n"
+    f"/quiet default — по умолчанию ({DEFAULT_QUIET_START}:00–{DEFAULT_QUIET_END:02d}:00, {DEFAULT_TIMEZONE})"
+)
+
+
+def _describe_quiet_hours(subscription: dict) -> str:
+    start = DEFAULT_QUIET_START if subscription['quiet_start'] is None else subscription['quiet_start']
+    end = DEFAULT_QUIET_END if subscription['quiet_end'] is None else subscription['quiet_end']
+    timezone = subscription['timezone'] or DEFAULT_TIMEZONE
+    if start == end:
+        return "отключены"
+    return f"{start:02d}:00–{end:02d}:00 ({timezone})"
+
+
+def parse_quiet_hours(args: list[str], current_timezone: str | None) -> tuple[int | None, int | None, str | None]:
+    """
+    Разбирает аргументы /quiet: "off", "default" или "<начало> <конец> [часовой пояс]" (часы 0–23).
+    Возвращает (quiet_start, quiet_end, timezone); бросает ValueError при некорректном вводе.
+    """
+    if len(args) == 1 and args[0].lower() == "off":
+        return 0, 0, current_timezone
+    if len(args) == 1 and args[0].lower() == "default":
+        return None, None, None
+    if len(args) not in (2, 3):
+        raise ValueError
+    start, end = int(args[0]), int(args[1])
+    if not (0 <= start <= 23 and 0 <= end <= 23):
+        raise ValueError
+    timezone = current_timezone
+    if len(args) == 3:
+        try:
+            ZoneInfo(args[2])
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError
+        timezone = args[2]
+    return start, end, timezone
+
+
+async def quiet_hours_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    subscription = db.get_subscription(user_id)
+    if not subscription:
+        await update.message.reply_text("ℹ️ У вас нет активных подписок. Используйте /subscribe.")
+        return
+    if not context.args:
+        await update.message.reply_text(f"Сейчас: {_describe_quiet_hours(subscription)}.\n\n{QUIET_USAGE}")
+        return
+
+    try:
+        quiet_start, quiet_end, timezone = parse_quiet_hours(context.args, subscription['timezone'])
+    except ValueError:
+        await update.message.reply_text(f"🚫 Не удалось разобрать тихие часы.\n\n{QUIET_USAGE}")
+        return
+
+    if db.set_quiet_hours(user_id, quiet_start, quiet_end, timezone):
+        subscription.update(quiet_start=quiet_start, quiet_end=quiet_end, timezone=timezone)
+        await update.message.reply_text(f"✅ Тихие часы: {_describe_quiet_hours(subscription)}.")
     else:
-        return "Опасно", "🟤"
+        await update.message.reply_text("⚠️ Не удалось сохранить тихие часы. Попробуйте позже.")
@@ -1,32 +1,11 @@
 # main.py
+import argparse
+import importlib
 import logging
-from telegram import Update
-from telegram.ext import (
-    Application, CommandHandler, MessageHandler, filters,
-    ConversationHandler, ContextTypes, CallbackQueryHandler
-)
-from config import TELEGRAM_BOT_TOKEN, AQICN_API_KEY
-from handlers.start import start_command
-from handlers.donate import donate_command
-from handlers.air_quality import (
-    aqi_command, # <<< ИЗМЕНЕНО: вместо get_air_quality_by_location и request_location_by_name
-    handle_location_input, # <<< ИЗМЕНЕНО: вместо handle_location_name_input
-    handle_location_selection,
-    GET_LOCATION_FOR_AQI # <<< ИЗМЕНЕНО: новое имя состояния
-)
-from handlers.info import show_recommendations, show_about_bot
-from handlers.subscriptions import (
-    subscribe_command,
-    handle_sub_location,
-    handle_sub_threshold,
-    unsubscribe_command,
-    my_subscriptions_command,
-    GET_SUB_LOCATION,
-    GET_SUB_THRESHOLD
-)
-from database import db
-from utils.air_quality_api import get_air_quality_data
-from utils.markdown_helpers import escape_markdown_v2
+import sys
+import time
+
+from config import TELEGRAM_BOT_TOKEN, METRICS_HOST, METRICS_PORT, PORT, TRACE_SPANS, validate_config
 
 # Настройка логирования
 logging.basicConfig(
@@ -36,148 +15,226 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 
 logger = logging.getLogger(__name__)
 
-# Проверка наличия API ключа AQICN при запуске
-if not AQICN_API_KEY:
-    logger.critical("AQICN_API_KEY не установлен! Бот не сможет получать данные о качестве воздуха.")
-
-# --- Функции для фонового задания уведомлений ---
-def _get_aqi_category_for_notifications(aqi: int) -> tuple[str, str]:
-    """Возвращает категорию и эмодзи для AQI."""
-    if aqi <= 50:
-        return "Хорошо", "🟢"
-    elif aqi <= 100:
-        return "Умеренно", "🟡"
-    elif aqi <= 150:
-        return "Неблагоприятно для чувствительных групп", "🟠"
-    elif aqi <= 200:
-        return "Неблагоприятно", "🔴"
-    elif aqi <= 300:
-        return "Очень неблагоприятно", "🟣"
-    else:
-        return "Опасно", "🟤"
-
-
-async def send_aqi_notifications(context: ContextTypes.DEFAULT_TYPE):
-    """Фоновое задание для отправки уведомлений о качестве воздуха."""
-    logger.info("Запуск задачи по рассылке уведомлений о качестве воздуха.")
-    subscriptions = db.get_all_active_subscriptions()
-    if not subscriptions:
-        logger.info("Нет активных подписок для рассылки.")
-        return
-
-    for sub in subscriptions:
-        user_id = sub['user_id']
-        chat_id = sub['chat_id']
-        latitude = sub['latitude']
-        longitude = sub['longitude']
-        location_name = sub['location_name']
-        aqi_threshold = sub['aqi_threshold']
-        last_notified_aqi = sub['last_notified_aqi']
+# --- Декларативная таблица обработчиков ---
+# Обработчики задаются строками "модуль:имя" и импортируются только при запуске бота,
+# поэтому `python main.py --check` и импорт main не тянут python-telegram-bot и httpx.
+# Виды: command, regex, location, text (текст без команд), callback (pattern), inline, conversation.
+
+AQI_CONVERSATION = {
+    "name": "aqi_conversation", # Имя нужно для сохранения состояния диалога между перезапусками
+    "entry_points": [
+        ("regex", "^📊 Качество воздуха сейчас$", "handlers.air_quality:aqi_command"), # Кнопка "Качество воздуха сейчас"
+        ("location", None, "handlers.air_quality:aqi_command"), # Прямая отправка локации
+        ("regex", "^🔎 Найти по названию$", "handlers.air_quality:aqi_command"), # Кнопка "Найти по названию"
+    ],
+    "states": {
+        "handlers.air_quality:GET_LOCATION_FOR_AQI": [
+            ("location", None, "handlers.air_quality:handle_location_input"),
+            ("text", None, "handlers.air_quality:handle_location_input"),
+            ("callback", "^select_location_.*|^cancel_selection$", "handlers.air_quality:handle_location_selection"),
+        ],
+    },
+    "fallbacks": [("command", "cancel", "handlers.start:start_command")],
+}
+
+SUB_CONVERSATION = {
+    "name": "sub_conversation",
+    "entry_points": [("regex", "^🔔 Подписаться$", "handlers.subscriptions:subscribe_command")],
+    "states": {
+        "handlers.subscriptions:GET_SUB_LOCATION": [
+            ("location", None, "handlers.subscriptions:handle_sub_location"),
+            ("text", None, "handlers.subscriptions:handle_sub_location"),
+        ],
+        "handlers.subscriptions:GET_SUB_THRESHOLD": [
+            ("text", None, "handlers.subscriptions:handle_sub_threshold"),
+        ],
+    },
+    "fallbacks": [("command", "cancel", "handlers.start:start_command")],
+}
+
+HANDLERS = [
+    ("command", "start", "handlers.start:start_command"),
+    ("regex", "^💖 Поддержать проект$", "handlers.donate:donate_command"),
+    ("command", "donate", "handlers.donate:donate_command"), # Также для команды /donate
+    ("conversation", AQI_CONVERSATION, None),
+    ("regex", "^💡 Рекомендации$", "handlers.info:show_recommendations"),
+    ("regex", "^❓ О боте$", "handlers.info:show_about_bot"),
+    ("conversation", SUB_CONVERSATION, None),
+    ("regex", "^🔕 Отписаться$", "handlers.subscriptions:unsubscribe_command"),
+    ("regex", "^📋 Мои подписки$", "handlers.subscriptions:my_subscriptions_command"),
+    ("command", "quiet", "handlers.subscriptions:quiet_hours_command"), # Тихие часы и часовой пояс подписки
+    ("inline", None, "handlers.inline:inline_aqi_query"), # Инлайн-режим: "@bot Джал" в любом чате
+]
+
+
+def _resolve(target: str):
+    """Импортирует объект по строке "модуль:имя"."""
+    module_name, _, attr = target.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _build_handler(kind: str, arg, target: str | None):
+    """Создает обработчик python-telegram-bot по записи из таблицы."""
+    from telegram.ext import (
+        CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler,
+        InlineQueryHandler
+    )
 
+    if kind == "conversation":
+        return ConversationHandler(
+            entry_points=[_build_handler(*spec) for spec in arg["entry_points"]],
+            states={
+                _resolve(state): [_build_handler(*spec) for spec in specs]
+                for state, specs in arg["states"].items()
+            },
+            fallbacks=[_build_handler(*spec) for spec in arg["fallbacks"]],
+            name=arg["name"],
+            persistent=True,
+        )
+
+    # Каждый обработчик измеряется в гистограмме ecomonitor_handler_duration_seconds
+    from utils import metrics
+    callback = metrics.timed(metrics.handler_duration, handler=target.partition(":")[2])(_resolve(target))
+    if kind == "command":
+        return CommandHandler(arg, callback)
+    if kind == "regex":
+        return MessageHandler(filters.Regex(arg), callback)
+    if kind == "location":
+        return MessageHandler(filters.LOCATION, callback)
+    if kind == "text":
+        return MessageHandler(filters.TEXT & ~filters.COMMAND, callback)
+    if kind == "callback":
+        return CallbackQueryHandler(callback, pattern=arg)
+    if kind == "inline":
+        return InlineQueryHandler(callback)
+    raise ValueError(f"Неизвестный тип обработчика: {kind}")
+
+
+def _handle_stop_signal(application) -> None:
+    """
+    SIGTERM/SIGINT (например, при редеплое на Render): рассылка дожидается отправки,
+    которая уже выполняется, и останавливается; остальное продолжится после перезапуска.
+    """
+    from handlers import notifications
+
+    logger.info("Получен сигнал остановки, завершение работы...")
+    notifications.request_stop()
+    application.stop_running()
+
+
+async def post_init(application) -> None:
+    """Прогрев кэшей, метрики очереди обновлений, эндпоинты /healthz и /metrics, обработка сигналов остановки."""
+    import asyncio
+    import signal
+    from utils import metrics, prefetch
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
         try:
-            current_air_data = await get_air_quality_data(latitude, longitude)
-            if not current_air_data or current_air_data.get('overall_aqi') is None:
-                logger.warning(f"Не удалось получить AQI для подписки {user_id} на локации {location_name}.")
-                continue
-
-            current_aqi = current_air_data['overall_aqi']
-            category, emoji = _get_aqi_category_for_notifications(current_aqi)
-
-            should_notify = False
-            if aqi_threshold is not None and current_aqi >= aqi_threshold:
-                if last_notified_aqi is None or current_aqi >= last_notified_aqi + 20 or current_aqi <= last_notified_aqi - 20:
-                    should_notify = True
-            elif aqi_threshold == 0:
-                 if last_notified_aqi is None or abs(current_aqi - last_notified_aqi) >= 15:
-                     should_notify = True
-
-
-            if should_notify:
-                report_text = (
-                    f"🔔 *Уведомление о качестве воздуха*\n\n"
-                    f"**Локация:** {escape_markdown_v2(location_name)}\n"
-                    f"**Текущий AQI:** `{escape_markdown_v2(str(current_aqi))}` {emoji} \\({escape_markdown_v2(category)}\\)\n"
-                    f"📅 Время данных: `{escape_markdown_v2(current_air_data.get('local_time', 'неизвестно'))}`\n\n"
-                    "ℹ️ Для подробной информации используйте /airquality"
-                )
-                await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=report_text,
-                    parse_mode='MarkdownV2'
-                )
-                db.update_last_notified_aqi(user_id, current_aqi)
-                logger.info(f"Уведомление отправлено пользователю {user_id} для {location_name} (AQI: {current_aqi}).")
-        except Exception as e:
-            logger.error(f"Ошибка при отправке уведомления для пользователя {user_id}: {e}", exc_info=True)
+            loop.add_signal_handler(sig, _handle_stop_signal, application)
+        except NotImplementedError:
+            # Windows: сигналы обрабатываются по умолчанию, прерванная рассылка продолжится при запуске
+            pass
+
+    await prefetch.warm_up(application)
+    metrics.update_queue_size.set_function(application.update_queue.qsize)
+    # Ссылки на серверы хранятся в utils.metrics, а не в bot_data: bot_data сохраняется в БД
+    if PORT:
+        # Публичный порт Render: только /healthz, метрики на нем не публикуются
+        await metrics.start_health_server(int(PORT))
+    if METRICS_PORT == PORT and PORT:
+        logger.warning("METRICS_PORT совпадает с публичным PORT: /metrics и /export не запускаются.")
+    elif METRICS_PORT:
+        await metrics.start_metrics_server(int(METRICS_PORT), METRICS_HOST)
+
+
+def check() -> int:
+    """Проверяет конфигурацию и таблицу обработчиков без запуска бота. Возвращает код выхода."""
+    started = time.perf_counter()
+    errors = validate_config()
+
+    kinds = {"command", "regex", "location", "text", "callback", "inline"}
+    specs = []
+    for kind, arg, target in HANDLERS:
+        if kind == "conversation":
+            for key in ("entry_points", "fallbacks"):
+                specs.extend(arg[key])
+            for state_specs in arg["states"].values():
+                specs.extend(state_specs)
+        else:
+            specs.append((kind, arg, target))
+    for kind, arg, target in specs:
+        if kind not in kinds or not target or ":" not in target:
+            errors.append(f"Некорректная запись в таблице обработчиков: {(kind, arg, target)}")
+
+    for error in errors:
+        logger.error(error)
+    logger.info(f"Проверка конфигурации завершена за {(time.perf_counter() - started) * 1000:.1f} мс.")
+    return 1 if errors else 0
 
 
 def main() -> None:
     """Запускает бота."""
+    errors = validate_config()
+    if not TELEGRAM_BOT_TOKEN:
+        for error in errors:
+            logger.critical(error)
+        sys.exit(1)
+    # Проверка наличия API ключа AQICN при запуске
+    for error in errors:
+        logger.critical(error)
+
+    from telegram import Update
+    from telegram.ext import Application, TypeHandler
+    from database import db
+    from database.persistence import SQLitePersistence
+    from handlers.notifications import send_aqi_notifications
+    from utils import metrics, prefetch
+    from utils.district_index import refresh_district_index, REFRESH_INTERVAL
+    from utils.adaptive_polling import SCHEDULER_TICK
+    from utils.subscriber_index import load_subscriber_index
+    from utils.quota import waqi_quota
+
+    metrics.TRACING_ENABLED = TRACE_SPANS
+
     # Инициализация базы данных при запуске бота
     db.init_db()
-
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
-
-    # Добавляем обработчик для команды /start
-    application.add_handler(CommandHandler("start", start_command))
-    application.add_handler(MessageHandler(filters.Regex("^💖 Поддержать проект$"), donate_command))
-    application.add_handler(CommandHandler("donate", donate_command)) # Также для команды /donate
-
-    # ConversationHandler для получения AQI
-    # Теперь он обрабатывает как отправку локации, так и ввод названия
-    aqi_conv_handler = ConversationHandler(
-        entry_points=[
-            MessageHandler(filters.Regex("^📊 Качество воздуха сейчас$"), aqi_command), # Кнопка "Качество воздуха сейчас"
-            MessageHandler(filters.LOCATION, aqi_command), # Прямая отправка локации
-            MessageHandler(filters.Regex("^🔎 Найти по названию$"), aqi_command) # Кнопка "Найти по названию"
-        ],
-        states={
-            GET_LOCATION_FOR_AQI: [
-                MessageHandler(filters.LOCATION, handle_location_input),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_location_input),
-                CallbackQueryHandler(handle_location_selection, pattern="^select_location_.*|^cancel_selection$")
-            ],
-        },
-        fallbacks=[CommandHandler("cancel", start_command)],
-    )
-    application.add_handler(aqi_conv_handler)
-    
-    # Удаляем старый обработчик для кнопки "📊 Качество воздуха сейчас",
-    # так как он теперь интегрирован в aqi_conv_handler
-    # application.add_handler(MessageHandler(filters.Regex("^📊 Качество воздуха сейчас$"), 
-    #                                        lambda update, context: update.message.reply_text(
-    #                                            "Чтобы узнать качество воздуха, пожалуйста, **отправьте мне свою геопозицию** "
-    #                                            "через кнопку скрепки (скрепка > Геопозиция) или **нажмите 'Найти по названию'** и введите название района."
-    #                                        )))
-
-
-    # Обработчики для новых кнопок "Рекомендации" и "О боте"
-    application.add_handler(MessageHandler(filters.Regex("^💡 Рекомендации$"), show_recommendations))
-    application.add_handler(MessageHandler(filters.Regex("^❓ О боте$"), show_about_bot))
-
-    # Обработчики для подписок
-    sub_conv_handler = ConversationHandler(
-        entry_points=[MessageHandler(filters.Regex("^🔔 Подписаться$"), subscribe_command)],
-        states={
-            GET_SUB_LOCATION: [
-                MessageHandler(filters.LOCATION, handle_sub_location),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_sub_location)
-            ],
-            GET_SUB_THRESHOLD: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_sub_threshold)]
-        },
-        fallbacks=[CommandHandler("cancel", start_command)]
+    # Запросы к WAQI до перезапуска тоже расходуют суточную квоту
+    waqi_quota.load_from_disk()
+    # Индекс подписчиков в памяти для рассылки; далее обновляется при каждой записи в БД
+    load_subscriber_index()
+
+    # Кэши прогреваются с диска до начала обработки обновлений;
+    # user_data и состояния диалогов сохраняются в БД и переживают перезапуск
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .persistence(SQLitePersistence())
+        .post_init(post_init)
+        .build()
     )
-    application.add_handler(sub_conv_handler)
-    application.add_handler(MessageHandler(filters.Regex("^🔕 Отписаться$"), unsubscribe_command))
-    application.add_handler(MessageHandler(filters.Regex("^📋 Мои подписки$"), my_subscriptions_command))
+
+    for kind, arg, target in HANDLERS:
+        application.add_handler(_build_handler(kind, arg, target))
 
     # Планируем фоновое задание для отправки уведомлений
-    application.job_queue.run_repeating(send_aqi_notifications, interval=1800, first=60)
+    application.job_queue.run_repeating(send_aqi_notifications, interval=SCHEDULER_TICK, first=60)
     logger.info("Задача по рассылке уведомлений запланирована.")
+    prefetch.schedule_peak_prefetch(application.job_queue)
+    # Индекс районов для инлайн-режима пересчитывается в фоне
+    application.job_queue.run_repeating(refresh_district_index, interval=REFRESH_INTERVAL, first=1)
 
+    # Замер времени до первого ответа после перезапуска
+    application.add_handler(TypeHandler(Update, prefetch.log_first_response), group=1)
 
     logger.info("Бот запущен! Ожидание команд...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    # Сигналы остановки обрабатываются в post_init (_handle_stop_signal)
+    application.run_polling(allowed_updates=Update.ALL_TYPES, stop_signals=None)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бишкек ЭкоМонитор бот")
+    parser.add_argument("--check", action="store_true", help="проверить конфигурацию и выйти")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(check())
     main()
@@ -0,0 +1,16 @@
+# tests/conftest.py
+import os
+
+import pytest
+
+os.environ.setdefault("AQICN_API_KEY", "test")
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Пустая БД во временном каталоге (database.db.DATABASE_NAME)."""
+    from database import db
+
+    monkeypatch.setattr(db, "DATABASE_NAME", str(tmp_path / "subscriptions.db"))
+    db.init_db()
+    return db
@@ -0,0 +1,69 @@
+# tests/test_aqi.py
+"""Проверки свойств utils/aqi.py: категории, суб-индексы и границы таблиц EPA."""
+import pytest
+
+from utils.aqi import (
+    AQI_CATEGORIES, EPA_BREAKPOINTS, _INDEX_RANGES, classify_many, compute_aqi, compute_sub_index, get_aqi_category,
+)
+
+
+def legacy_aqi_category(aqi: int) -> tuple[str, str]:
+    """Прежняя цепочка if из main.py (до utils/aqi.py) — эталон."""
+    if aqi <= 50:
+        return "Хорошо", "🟢"
+    elif aqi <= 100:
+        return "Умеренно", "🟡"
+    elif aqi <= 150:
+        return "Неблагоприятно для чувствительных групп", "🟠"
+    elif aqi <= 200:
+        return "Неблагоприятно", "🔴"
+    elif aqi <= 300:
+        return "Очень неблагоприятно", "🟣"
+    else:
+        return "Опасно", "🟤"
+
+
+def test_category_matches_legacy_if_chain():
+    for aqi in range(0, 601):
+        assert get_aqi_category(aqi) == legacy_aqi_category(aqi), aqi
+
+
+def test_classify_many_matches_get_aqi_category():
+    values = list(range(0, 601)) + [50.5, 100.1, 300.9]
+    assert [AQI_CATEGORIES[i] for i in classify_many(values)] == [get_aqi_category(v) for v in values]
+
+
+@pytest.mark.parametrize("pollutant", sorted(EPA_BREAKPOINTS))
+def test_sub_index_is_monotonic(pollutant):
+    bounds, digits = EPA_BREAKPOINTS[pollutant]
+    step = 10 ** -digits
+    stride = max(1, int(bounds[-1] / step) // 20000)
+    previous = -1
+    value = 0.0
+    while value <= bounds[-1] + 10 * step:
+        index = compute_sub_index(pollutant, round(value, digits))
+        assert index >= previous, value
+        previous = index
+        value += step * stride
+
+
+@pytest.mark.parametrize("pollutant", sorted(EPA_BREAKPOINTS))
+def test_sub_index_hits_range_bounds_at_breakpoints(pollutant):
+    bounds, digits = EPA_BREAKPOINTS[pollutant]
+    step = 10 ** -digits
+    for i, (index_low, index_high) in enumerate(_INDEX_RANGES):
+        low = 0 if i == 0 else round(bounds[i] + step, digits)
+        assert compute_sub_index(pollutant, low) == index_low, low
+        assert compute_sub_index(pollutant, bounds[i + 1]) == index_high, bounds[i + 1]
+
+
+def test_sub_index_caps_and_rejects_invalid_input():
+    assert compute_sub_index("pm25", 10_000) == 500
+    assert compute_sub_index("pm25", -1) is None
+    assert compute_sub_index("unknown", 10) is None
+    assert compute_sub_index("PM2.5", 35.4) == compute_sub_index("pm25", 35.4)
+
+
+def test_compute_aqi_takes_dominant_pollutant():
+    aqi, sub_indices = compute_aqi({"pm25": 35.4, "pm10": 54})
+    assert aqi == max(sub_indices.values()) == 100
@@ -0,0 +1,34 @@
+# tests/test_cache.py
+"""TTLCache: срок жизни записей и ограничение размера в памяти."""
+from utils.cache import TTLCache
+
+
+def test_expired_entry_is_a_miss_but_kept_as_fallback(database, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.cache.time.time", lambda: now[0])
+    cache = TTLCache("test_ttl", ttl=60)
+    cache.set("a", {"aqi": 1})
+    now[0] += 61
+    assert cache.get("a") is None
+    assert cache.get("a", max_age=float("inf")) == {"aqi": 1}
+
+
+def test_size_is_capped_and_least_recently_used_is_evicted(database):
+    cache = TTLCache("test_lru", ttl=60, max_entries=3)
+    for key in ("a", "b", "c"):
+        cache.set(key, key, persist=False)
+    assert cache.get("a") == "a"  # "a" становится недавно использованной
+    cache.set("d", "d", persist=False)
+    assert len(cache) == 3
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in ("a", "c", "d")] == ["a", "c", "d"]
+
+
+def test_load_from_disk_keeps_newest_entries(database):
+    writer = TTLCache("test_disk", ttl=60)
+    for key in ("a", "b", "c"):
+        writer.set(key, key)
+    reader = TTLCache("test_disk", ttl=60, max_entries=2)
+    assert reader.load_from_disk() == 3
+    assert len(reader) == 2
+    assert reader.get("c") == "c"
@@ -0,0 +1,110 @@
+# tests/test_export.py
+"""История показаний и выгрузка (utils/export.py): только точки районов, доступ по токену, лимит периода."""
+import asyncio
+import sqlite3
+
+import pytest
+
+from utils import air_quality_api, export, metrics
+from utils.cache import air_quality_cache, location_key
+from utils.district_index import BISHKEK_DISTRICTS
+
+DISTRICT_NAME, DISTRICT_LAT, DISTRICT_LON = BISHKEK_DISTRICTS[0]
+USER_LAT, USER_LON = 42.81234, 74.51234
+TOKEN = "secret"
+
+
+class _FakeSource:
+    name = "waqi"
+    weight = 1.0
+    reference = True
+
+    async def fetch(self, client, latitude, longitude):
+        return [{"source": self.name, "station": "Test", "aqi": 80, "observed_at": None,
+                 "local_time": "", "iaqi": {"PM2.5": 80}}]
+
+
+@pytest.fixture
+def history(database, monkeypatch):
+    """История с показаниями точки района и точки пользователя (как до исправления)."""
+    monkeypatch.setattr(export, "EXPORT_TOKEN", TOKEN)
+    for latitude, longitude in ((DISTRICT_LAT, DISTRICT_LON), (USER_LAT, USER_LON)):
+        database.save_reading(export.parse_time("2024-01-10"), *location_key(latitude, longitude), "Test", 80)
+    return database
+
+
+def _rows(database) -> list:
+    conn = sqlite3.connect(database.DATABASE_NAME)
+    rows = conn.execute("SELECT latitude, longitude FROM readings").fetchall()
+    conn.close()
+    return rows
+
+
+def test_only_district_fetches_are_recorded(database, monkeypatch):
+    monkeypatch.setattr(air_quality_api, "configured_sources", lambda: [_FakeSource()])
+    monkeypatch.setattr(air_quality_cache, "_entries", {})
+    asyncio.run(air_quality_api.get_air_quality_data(USER_LAT, USER_LON, force_refresh=True))
+    assert _rows(database) == []
+    asyncio.run(air_quality_api.get_air_quality_data(DISTRICT_LAT, DISTRICT_LON, force_refresh=True,
+                                                     record_history=True))
+    assert _rows(database) == [location_key(DISTRICT_LAT, DISTRICT_LON)]
+
+
+def test_export_contains_only_district_points(history):
+    body = b"".join(export.export("readings", "csv", export.parse_time("2024-01-01"), export.parse_time("2024-02-01")))
+    lines = body.decode("utf-8").splitlines()
+    assert len(lines) == 2
+    assert f"{USER_LAT:.3f}" not in body.decode("utf-8")
+    with pytest.raises(export.ExportError):
+        export.export("readings", "csv", 0, 1, location_key(USER_LAT, USER_LON))
+
+
+async def _request(port: int, path: str, token: str | None = None) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    auth = f"Authorization: Bearer {token}\r\n" if token else ""
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: test\r\n{auth}\r\n".encode("latin-1"))
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return data
+
+
+def _serve(*requests) -> list[bytes]:
+    async def scenario():
+        server = await metrics.start_metrics_server(0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return [await _request(port, *request) for request in requests]
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    return asyncio.run(scenario())
+
+
+def test_http_export_requires_token_and_caps_period(history):
+    path = "/export/readings?from=2024-01-01&to=2024-02-01"
+    anonymous, wrong, ok, too_long = _serve(
+        (path,), (path, "wrong"), (path, TOKEN), ("/export/readings?from=2023-01-01&to=2025-01-01", TOKEN),
+    )
+    assert anonymous.startswith(b"HTTP/1.1 403")
+    assert wrong.startswith(b"HTTP/1.1 403")
+    assert ok.startswith(b"HTTP/1.1 200") and ok.endswith(b"0\r\n\r\n")
+    assert too_long.startswith(b"HTTP/1.1 400")
+
+
+def test_http_export_is_disabled_without_token(history, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_TOKEN", None)
+    (response,) = _serve(("/export/readings?from=2024-01-01&to=2024-02-01", ""))
+    assert response.startswith(b"HTTP/1.1 403")
+
+
+def test_http_export_read_error_aborts_without_final_chunk(history, monkeypatch):
+    def broken_rows(start, end, location=None):
+        yield ("2024-01-10T00:00:00+00:00", DISTRICT_LAT, DISTRICT_LON, "Test", 80, None, None, "waqi")
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(export, "reading_rows", broken_rows)
+    (response,) = _serve(("/export/readings?from=2024-01-01&to=2024-02-01", TOKEN))
+    assert response.startswith(b"HTTP/1.1 200")
+    assert not response.endswith(b"0\r\n\r\n")
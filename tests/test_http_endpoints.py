@@ -0,0 +1,45 @@
+# tests/test_http_endpoints.py
+"""HTTP-эндпоинты utils/metrics.py: публичный порт отдает только /healthz."""
+import asyncio
+
+from utils import metrics
+
+
+async def _get(port: int, path: str) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: test\r\n\r\n".encode("latin-1"))
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return data
+
+
+def test_public_port_serves_only_healthz():
+    async def scenario():
+        server = await metrics.start_health_server(0, host="127.0.0.1")
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return [await _get(port, path) for path in ("/healthz", "/metrics", "/export/readings")]
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    healthz, metrics_page, export_page = asyncio.run(scenario())
+    assert healthz.startswith(b"HTTP/1.1 200")
+    assert metrics_page.startswith(b"HTTP/1.1 404")
+    assert export_page.startswith(b"HTTP/1.1 404")
+
+
+def test_metrics_server_listens_on_localhost_by_default():
+    async def scenario():
+        server = await metrics.start_metrics_server(0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return server.sockets[0].getsockname()[0], await _get(port, "/metrics")
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    host, page = asyncio.run(scenario())
+    assert host == "127.0.0.1"
+    assert page.startswith(b"HTTP/1.1 200")
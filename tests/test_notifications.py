@@ -0,0 +1,142 @@
+# tests/test_notifications.py
+"""Рассылка уведомлений (handlers/notifications.py): частота опроса локаций и контрольные точки."""
+import asyncio
+import collections
+import shutil
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeBot, FakeContext
+from benchmarks.generators import generate_locations, populate_database
+from handlers import notifications
+from utils.adaptive_polling import AdaptivePoller, MIN_POLL_INTERVAL, SCHEDULER_TICK
+from utils.cache import air_quality_cache, air_quality_key
+from utils.subscriber_index import load_subscriber_index
+
+LATITUDE, LONGITUDE = 42.876, 74.604
+
+
+@pytest.fixture
+def sweep(database, monkeypatch):
+    """
+    Рассылка с управляемыми часами и фейковым API: возвращает (часы, время запросов к API).
+    AQI держится чуть ниже порога подписчика, поэтому планировщик опрашивает локацию раз в MIN_POLL_INTERVAL.
+    """
+    clock = [1_700_000_000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    monkeypatch.setattr(notifications, "poller", AdaptivePoller())
+    monkeypatch.setattr(notifications, "stop_requested", False)
+    monkeypatch.setattr(air_quality_cache, "_entries", {})
+    fetched_at = []
+
+    async def fake_air_quality(latitude, longitude, force_refresh=False):
+        fetched_at.append(clock[0])
+        data = {"overall_aqi": 90, "city_name": "Test", "local_time": "", "iaqi": {}, "sources": ["waqi"]}
+        air_quality_cache.set(air_quality_key(latitude, longitude), data, persist=False)
+        return data
+
+    monkeypatch.setattr(notifications, "get_air_quality_data", fake_air_quality)
+    database.add_subscription(1, 1, LATITUDE, LONGITUDE, "Центр", 100)
+    load_subscriber_index()
+    return clock, fetched_at
+
+
+def test_polling_keeps_min_interval_near_threshold(sweep):
+    clock, fetched_at = sweep
+    context = FakeContext(FakeBot())
+    start = clock[0]
+    for _ in range(2 * 3600 // SCHEDULER_TICK):
+        asyncio.run(notifications.send_aqi_notifications(context))
+        clock[0] += SCHEDULER_TICK
+    minutes = [round((t - start) / 60) for t in fetched_at]
+    assert minutes == list(range(0, 120, MIN_POLL_INTERVAL // 60)), minutes
+
+
+def test_first_poll_after_restart_reuses_fresh_cache(sweep):
+    clock, fetched_at = sweep
+    # Показание получено прогревом при старте (utils/prefetch.warm_up) пять минут назад
+    air_quality_cache.set(
+        air_quality_key(LATITUDE, LONGITUDE),
+        {"overall_aqi": 90, "city_name": "Test", "local_time": "", "iaqi": {}, "sources": ["waqi"]},
+        persist=False,
+    )
+    clock[0] += 5 * 60
+    asyncio.run(notifications.send_aqi_notifications(FakeContext(FakeBot())))
+    assert fetched_at == []
+
+
+@pytest.fixture
+def crash_recovery(database, tmp_path, monkeypatch):
+    """
+    Рассылка на 400 подписчиков с фейковым API, который сохраняет показания в кэш на диске.
+    Возвращает (restart, fetches): restart(name, fresh) имитирует перезапуск процесса —
+    сбрасывает состояние в памяти и прогревает кэш с диска; fresh=True начинает с копии исходной БД.
+    """
+    base = database.DATABASE_NAME
+    populate_database(base, 400, generate_locations(40, seed=7), seed=7)
+    fetches = []
+
+    async def fake_air_quality(latitude, longitude, force_refresh=False):
+        fetches.append((latitude, longitude))
+        await asyncio.sleep(0)
+        data = {
+            "overall_aqi": 40 + int(latitude * 1e4 + longitude * 1e4) % 160,
+            "city_name": "Test", "local_time": "", "iaqi": {}, "sources": ["waqi"],
+        }
+        air_quality_cache.set(air_quality_key(latitude, longitude), data)
+        return data
+
+    monkeypatch.setattr(notifications, "get_air_quality_data", fake_air_quality)
+    monkeypatch.setattr(air_quality_cache, "_entries", {})
+
+    def restart(name: str, fresh: bool) -> None:
+        path = str(tmp_path / f"{name}.db")
+        if fresh:
+            shutil.copy(base, path)
+        monkeypatch.setattr(database, "DATABASE_NAME", path)
+        monkeypatch.setattr(notifications, "poller", AdaptivePoller())
+        monkeypatch.setattr(notifications, "stop_requested", False)
+        air_quality_cache._entries.clear()
+        air_quality_cache.load_from_disk()
+        load_subscriber_index()
+
+    return restart, fetches
+
+
+@pytest.mark.parametrize("trigger, graceful", [("fetch", False), ("send", False), ("send", True)],
+                         ids=["kill_during_fetch", "kill_during_send", "sigterm_during_send"])
+def test_interrupted_sweep_delivers_each_notification_once(crash_recovery, trigger, graceful):
+    restart, fetches = crash_recovery
+
+    async def scenario():
+        restart("control", fresh=True)
+        bot = FakeBot(latency=0.001)
+        await notifications.send_aqi_notifications(FakeContext(bot))
+        expected = collections.Counter(chat_id for chat_id, _ in bot.sent)
+        threshold = (len(fetches) if trigger == "fetch" else len(bot.sent)) // 2
+
+        restart(f"{trigger}-{graceful}", fresh=True)
+        fetches.clear()
+        bot = FakeBot(latency=0.001)
+        task = asyncio.create_task(notifications.send_aqi_notifications(FakeContext(bot)))
+        while not task.done() and len(fetches if trigger == "fetch" else bot.sent) < threshold:
+            await asyncio.sleep(0)
+        sent_before_stop = len(bot.sent)
+        if graceful:
+            notifications.request_stop()
+            await task
+        else:
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        restart(f"{trigger}-{graceful}", fresh=False)
+        await notifications.send_aqi_notifications(FakeContext(bot))
+        return expected, sent_before_stop, collections.Counter(chat_id for chat_id, _ in bot.sent)
+
+    expected, sent_before_stop, delivered = asyncio.run(scenario())
+    assert sum(expected.values()) > 0
+    if trigger == "send":
+        assert 0 < sent_before_stop < sum(expected.values())
+    assert delivered == expected
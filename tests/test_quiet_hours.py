@@ -0,0 +1,53 @@
+# tests/test_quiet_hours.py
+"""Тихие часы и часовой пояс подписки: разбор /quiet, сохранение в БД и учет при рассылке."""
+import pytest
+
+from handlers.subscriptions import parse_quiet_hours
+from utils import alerts
+from utils.alerts import local_time
+
+
+def test_parse_quiet_hours():
+    assert parse_quiet_hours(["22", "6"], None) == (22, 6, None)
+    assert parse_quiet_hours(["22", "6", "Europe/Moscow"], None) == (22, 6, "Europe/Moscow")
+    assert parse_quiet_hours(["off"], "Asia/Almaty") == (0, 0, "Asia/Almaty")
+    assert parse_quiet_hours(["default"], "Asia/Almaty") == (None, None, None)
+
+
+@pytest.mark.parametrize("args", [[], ["7"], ["24", "7"], ["-1", "7"], ["a", "b"], ["22", "6", "Mars/Olympus"]])
+def test_parse_quiet_hours_rejects_invalid_input(args):
+    with pytest.raises(ValueError):
+        parse_quiet_hours(args, None)
+
+
+def test_quiet_hours_survive_resubscribe(database):
+    database.add_subscription(1, 1, 42.87, 74.6, "Центр", 100)
+    assert database.set_quiet_hours(1, 22, 6, "Europe/Moscow")
+    database.add_subscription(1, 1, 42.83, 74.57, "Джал", 150)
+    sub = database.get_subscription(1)
+    assert (sub["quiet_start"], sub["quiet_end"], sub["timezone"]) == (22, 6, "Europe/Moscow")
+    assert sub["aqi_threshold"] == 150
+    assert not database.set_quiet_hours(2, 22, 6, None)
+
+
+def _subscription(**overrides) -> dict:
+    sub = {
+        "user_id": 1, "latitude": 42.87, "longitude": 74.6, "aqi_threshold": 100, "alert_state": "normal",
+        "last_notified_aqi": None, "last_notified_at": None, "last_digest_date": None,
+        "timezone": None, "quiet_start": None, "quiet_end": None,
+    }
+    sub.update(overrides)
+    return sub
+
+
+def test_user_quiet_hours_defer_alerts_in_user_timezone():
+    readings = {alerts.location_key(42.87, 74.6): 160}
+    # 2024-01-15 20:00 UTC: 02:00 в Бишкеке, 23:00 в Москве
+    now = 1705348800
+    assert local_time(now, None).hour == 2
+    assert alerts.evaluate_subscriptions([_subscription()], readings, now) == []
+    # Тихие часы отключены
+    assert len(alerts.evaluate_subscriptions([_subscription(quiet_start=0, quiet_end=0)], readings, now)) == 1
+    # В Москве 23:00 — еще не тихие часы с полуночи
+    moscow = _subscription(timezone="Europe/Moscow", quiet_start=0, quiet_end=6)
+    assert len(alerts.evaluate_subscriptions([moscow], readings, now)) == 1
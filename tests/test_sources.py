@@ -0,0 +1,60 @@
+# tests/test_sources.py
+"""Адаптеры источников (utils/sources.py) на сохраненных ответах и объединение наблюдений (utils/fusion.py)."""
+import json
+import os
+
+import pytest
+
+from utils import sources
+from utils.fusion import fuse
+
+FIXTURES = os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks", "fixtures")
+WEIGHTS = {name: source.weight for name, source in sources.SOURCES.items()}
+REFERENCES = {name for name, source in sources.SOURCES.items() if source.reference}
+
+
+def _observation(source: str, station: str, aqi: int, observed_at: float = 0.0) -> dict:
+    return {"source": source, "station": station, "aqi": aqi, "observed_at": observed_at,
+            "local_time": "", "iaqi": {"PM2.5": aqi}}
+
+
+def test_adapter_without_parse_fails_at_instantiation():
+    class Incomplete(sources.AirQualitySource):
+        name = "incomplete"
+
+        def request(self, latitude, longitude):
+            return "https://example.invalid", {}
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.parametrize("name", sorted(sources.SOURCES))
+def test_adapters_parse_fixtures(name):
+    with open(os.path.join(FIXTURES, f"{name}.json"), encoding="utf-8") as f:
+        observations = sources.SOURCES[name]().parse(json.load(f), 42.8746, 74.5698)
+    assert observations
+    for observation in observations:
+        assert observation["source"] == name
+        assert isinstance(observation["aqi"], (int, float))
+
+
+def test_sensors_do_not_outvote_reference_station():
+    station = _observation("waqi", "Bishkek US Embassy", 160)
+    crowd = [_observation("sensor_community", f"Sensor.Community #{i}", aqi)
+             for i, aqi in enumerate((95, 100, 105, 110))]
+    report = fuse([station] + crowd, 300, WEIGHTS, REFERENCES)
+    assert report["overall_aqi"] == 160
+    assert report["city_name"] == station["station"]
+    assert report["iaqi"] == station["iaqi"]
+
+
+def test_single_sensor_outlier_is_rejected():
+    observations = [
+        _observation("waqi", "Station", 150),
+        _observation("open_meteo", "Model", 140),
+        _observation("sensor_community", "Sensor.Community #1", 155),
+        _observation("sensor_community", "Sensor.Community #2", 500),
+    ]
+    report = fuse(observations, 300, WEIGHTS, REFERENCES)
+    assert report["overall_aqi"] < 160
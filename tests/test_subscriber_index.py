@@ -0,0 +1,67 @@
+# tests/test_subscriber_index.py
+"""Индекс подписчиков в памяти (utils/subscriber_index.py)."""
+from utils.alerts import MAX_AQI_THRESHOLD
+from utils.cache import location_key
+from utils.subscriber_index import SubscriberIndex, load_subscriber_index
+
+LATITUDE, LONGITUDE = 42.876, 74.604
+KEY = location_key(LATITUDE, LONGITUDE)
+
+
+def test_huge_threshold_does_not_drop_subscriber_or_break_startup(database):
+    index = load_subscriber_index()
+    database.add_subscription(1, 1, LATITUDE, LONGITUDE, "Центр", 10 ** 10)
+    assert len(index) == 1
+    assert index.thresholds_by_key()[KEY] == {MAX_AQI_THRESHOLD}
+    # Повторная сборка при запуске (main) не падает
+    assert len(load_subscriber_index()) == 1
+
+
+def test_build_skips_corrupted_rows():
+    index = SubscriberIndex()
+    index.build([
+        (1, 1, LATITUDE, LONGITUDE, 100, "normal"),
+        (2, 2, LATITUDE, LONGITUDE, "много", "normal"),
+        (3, 3, None, LONGITUDE, 100, "normal"),
+        (4, 4, LATITUDE, LONGITUDE, -5, "alert"),
+    ])
+    assert len(index) == 2
+    assert index.thresholds_by_key()[KEY] == {0, 100}
+
+
+def _expected_candidates(members: dict, aqi: int) -> set:
+    """Эталон: полный перебор подписчиков локации."""
+    expected = set()
+    for user_id, (threshold, alert) in members.items():
+        if threshold <= aqi or (alert and threshold > aqi + min(10, aqi)):
+            expected.add(user_id)
+    return expected
+
+
+def test_candidates_match_brute_force_after_updates():
+    import random
+
+    rnd = random.Random(7)
+    index = SubscriberIndex()
+    members = {user_id: (rnd.choice([0, 50, 100, 150, rnd.randint(1, 300)]), rnd.random() < 0.3)
+               for user_id in range(1, 400)}
+    index.build([(user_id, user_id, LATITUDE, LONGITUDE, threshold, "alert" if alert else "normal")
+                 for user_id, (threshold, alert) in members.items()])
+    for _ in range(300):
+        user_id = rnd.randint(1, 450)
+        action = rnd.random()
+        if action < 0.4 and user_id in members:
+            alert = rnd.random() < 0.5
+            index.set_alert_state(user_id, "alert" if alert else "normal")
+            members[user_id] = (members[user_id][0], alert)
+        elif action < 0.7:
+            threshold = rnd.randint(0, 300)
+            index.upsert(user_id, user_id, LATITUDE, LONGITUDE, threshold)
+            members[user_id] = (threshold, False)
+        else:
+            index.remove(user_id)
+            members.pop(user_id, None)
+    for aqi in range(0, 320, 3):
+        candidates = index.candidates(KEY, aqi)
+        assert len(candidates) == len(set(candidates))
+        assert set(candidates) == _expected_candidates(members, aqi), aqi
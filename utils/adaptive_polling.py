@@ -0,0 +1,118 @@
+# utils/adaptive_polling.py
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Как часто запускается рассылка; реальная частота опроса каждой локации определяется ниже
+SCHEDULER_TICK = 5 * 60
+
+MIN_POLL_INTERVAL = 20 * 60
+BASE_POLL_INTERVAL = 30 * 60
+MAX_POLL_INTERVAL = 60 * 60
+
+# Сколько последних показаний учитывается при оценке изменчивости
+HISTORY_SIZE = 6
+# Изменчивость (изменение AQI в час), при которой опрос учащается
+HIGH_VOLATILITY = 45
+# Стабильные показания (чистый летний воздух или затяжной смог без изменений): опрос реже
+LOW_VOLATILITY = 15
+# Если AQI ниже порога кого-то из подписчиков меньше чем на это значение, опрос учащается
+THRESHOLD_PROXIMITY = 25
+# Доля квоты, которую может занимать плановый опрос (остальное — интерактивные запросы)
+QUOTA_SHARE = 0.8
+
+
+class _LocationState:
+    __slots__ = ("readings", "last_polled", "interval")
+
+    def __init__(self):
+        self.readings = deque(maxlen=HISTORY_SIZE)  # (время, AQI)
+        self.last_polled = None
+        self.interval = MIN_POLL_INTERVAL
+
+
+class AdaptivePoller:
+    """
+    Определяет, какие локации пора опросить. Интервал опроса каждой локации зависит от
+    изменчивости последних показаний, близости AQI к порогам подписчиков и бюджета квоты API:
+    в эпизоды загрязнения опрос учащается до MIN_POLL_INTERVAL, в чистую стабильную
+    погоду — разрежается до MAX_POLL_INTERVAL.
+    """
+
+    def __init__(self, quota=None):
+        self.quota = quota
+        self._states = {}
+
+    def record(self, key, aqi: int, now: float) -> None:
+        """Запоминает показание локации."""
+        self._states.setdefault(key, _LocationState()).readings.append((now, aqi))
+
+    def has_readings(self, key) -> bool:
+        """Есть ли у локации показания с момента запуска (False — первый опрос после перезапуска)."""
+        state = self._states.get(key)
+        return state is not None and bool(state.readings)
+
+    @staticmethod
+    def volatility(state: _LocationState) -> float:
+        """Средняя скорость изменения AQI (в единицах AQI за час) по последним показаниям."""
+        readings = state.readings
+        if len(readings) < 2:
+            return 0.0
+        total_change = sum(abs(b[1] - a[1]) for a, b in zip(readings, list(readings)[1:]))
+        hours = (readings[-1][0] - readings[0][0]) / 3600
+        return total_change / hours if hours > 0 else 0.0
+
+    def desired_interval(self, state: _LocationState, thresholds) -> float:
+        """Желаемый интервал опроса локации без учета квоты."""
+        if not state.readings:
+            return MIN_POLL_INTERVAL
+        aqi = state.readings[-1][1]
+        volatility = self.volatility(state)
+
+        interval = BASE_POLL_INTERVAL
+        if volatility >= HIGH_VOLATILITY:
+            interval = MIN_POLL_INTERVAL
+        elif volatility >= HIGH_VOLATILITY / 2:
+            interval = (MIN_POLL_INTERVAL + BASE_POLL_INTERVAL) / 2
+        elif volatility < LOW_VOLATILITY:
+            interval = MAX_POLL_INTERVAL
+
+        # Важнее всего вовремя заметить пересечение порога снизу вверх
+        gaps = [threshold - aqi for threshold in thresholds if threshold and threshold >= aqi]
+        if gaps and min(gaps) <= THRESHOLD_PROXIMITY:
+            interval = min(interval, MIN_POLL_INTERVAL)
+        return max(MIN_POLL_INTERVAL, min(MAX_POLL_INTERVAL, interval))
+
+    def due(self, thresholds_by_key: dict, now: float) -> list:
+        """
+        Возвращает ключи локаций, которые пора опросить, и отмечает их как опрошенные.
+        thresholds_by_key — {ключ локации: пороги AQI подписчиков этой локации}.
+        """
+        # Локации без подписчиков больше не отслеживаются
+        for key in list(self._states):
+            if key not in thresholds_by_key:
+                del self._states[key]
+
+        states = {key: self._states.setdefault(key, _LocationState()) for key in thresholds_by_key}
+        for key, state in states.items():
+            state.interval = self.desired_interval(state, thresholds_by_key[key])
+
+        # Если плановый опрос не укладывается в квоту, все интервалы растягиваются пропорционально
+        rate = self.quota.sustained_rate() if self.quota is not None else None
+        if rate and states:
+            planned = sum(1 / state.interval for state in states.values())
+            budget = rate * QUOTA_SHARE
+            if planned > budget:
+                scale = planned / budget
+                logger.warning(f"Плановый опрос превышает квоту, интервалы увеличены в {scale:.1f} раза.")
+                for state in states.values():
+                    state.interval *= scale
+
+        due = []
+        for key, state in states.items():
+            # Допуск в половину такта компенсирует неточность запуска заданий JobQueue
+            if state.last_polled is None or now - state.last_polled >= state.interval - SCHEDULER_TICK / 2:
+                state.last_polled = now
+                due.append(key)
+        return due
@@ -1,71 +1,94 @@
 # utils/air_quality_api.py
-import httpx
+import asyncio
+import json
 import logging
-from config import AQICN_API_KEY # Этот импорт оставляем, он нужен для доступа к ключу
+import time
+from database import db
+from utils.cache import air_quality_cache, air_quality_key, location_key
+from utils import metrics
+from utils.fusion import fuse
+from utils.sources import configured_sources, QuotaExhausted
 
 logger = logging.getLogger(__name__)
 
-AQICN_API_BASE_URL = "https://api.waqi.info/feed/geo:{lat};{lon}/"
 
-async def get_air_quality_data(latitude: float, longitude: float) -> dict | None:
+async def _fetch_source(source, client, latitude: float, longitude: float) -> list[dict]:
+    """Опрашивает один источник; ошибки источника не мешают остальным."""
+    import httpx
+
+    try:
+        return await source.fetch(client, latitude, longitude)
+    except QuotaExhausted:
+        raise
+    except httpx.RequestError as exc:
+        metrics.upstream_errors_total.inc(api=source.name)
+        logger.error(f"Ошибка запроса к источнику {source.name}: {exc}")
+    except httpx.HTTPStatusError as exc:
+        metrics.upstream_errors_total.inc(api=source.name)
+        logger.error(f"Ошибка HTTP статуса от источника {source.name}: {exc.response.status_code} - {exc.response.text}")
+    except Exception as e:
+        metrics.upstream_errors_total.inc(api=source.name)
+        logger.error(f"Неожиданная ошибка при получении данных от источника {source.name}: {e}", exc_info=True)
+    return []
+
+
+async def get_air_quality_data(latitude: float, longitude: float, force_refresh: bool = False,
+                               record_history: bool = False) -> dict | None:
     """
-    Получает данные о качестве воздуха для заданных координат с aqicn.org.
+    Получает данные о качестве воздуха для заданных координат.
+    Все настроенные источники (AIR_QUALITY_SOURCES, по умолчанию только aqicn.org) опрашиваются
+    параллельно, их наблюдения объединяются в utils/fusion.py.
+    Свежие данные отдаются из кэша; force_refresh=True всегда обращается к API.
+    record_history=True сохраняет новое показание в историю (таблица readings). Только для точек
+    районов (utils/district_index.py): координаты пользователей и подписок в историю не попадают.
     Возвращает словарь с данными или None в случае ошибки.
     """
-    if not AQICN_API_KEY:
-        logger.error("AQICN_API_KEY не установлен. Невозможно получить данные о качестве воздуха.")
-        return None
-
-    url = AQICN_API_BASE_URL.format(lat=latitude, lon=longitude)
-    params = {
-        "token": AQICN_API_KEY
-    }
+    cache_key = air_quality_key(latitude, longitude)
+    if not force_refresh:
+        cached = air_quality_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            if data.get("status") == "ok":
-                iaqi = data["data"].get("iaqi", {}) # Индивидуальные индексы загрязнителей
-                aqi = data["data"].get("aqi") # Общий AQI
-                city = data["data"].get("city", {}).get("name", "Неизвестно")
-                time_data = data["data"].get("time", {})
+    sources = configured_sources()
+    if not sources:
+        logger.error("Не настроено ни одного источника данных о качестве воздуха.")
+        return None
 
-                # Формируем отчет
-                report_data = {
-                    "overall_aqi": aqi,
-                    "city_name": city,
-                    "local_time": time_data.get("s", "Неизвестно"), # 's' - время станции
-                    "iaqi": {}
-                }
+    import httpx  # Импорт по требованию: httpx не нужен при старте и при проверке конфигурации
 
-                # Извлекаем данные по основным загрязнителям
-                if 'pm25' in iaqi:
-                    report_data["iaqi"]["PM2.5"] = iaqi['pm25']['v']
-                if 'pm10' in iaqi:
-                    report_data["iaqi"]["PM10"] = iaqi['pm10']['v']
-                if 'o3' in iaqi:
-                    report_data["iaqi"]["O3"] = iaqi['o3']['v']
-                if 'co' in iaqi:
-                    report_data["iaqi"]["CO"] = iaqi['co']['v']
-                if 'so2' in iaqi:
-                    report_data["iaqi"]["SO2"] = iaqi['so2']['v']
-                if 'no2' in iaqi:
-                    report_data["iaqi"]["NO2"] = iaqi['no2']['v']
+    async with httpx.AsyncClient() as client:
+        results = await asyncio.gather(
+            *(_fetch_source(source, client, latitude, longitude) for source in sources),
+            return_exceptions=True
+        )
 
-                return report_data
-            else:
-                logger.warning(f"Ошибка от AQICN API: {data.get('data', 'Нет данных или статус не OK')}")
-                return None
+    observations = []
+    quota_exhausted = False
+    for result in results:
+        if isinstance(result, QuotaExhausted):
+            quota_exhausted = True
+        elif isinstance(result, BaseException):
+            logger.error(f"Ошибка при опросе источника данных: {result}")
+        else:
+            observations.extend(result)
 
-    except httpx.RequestError as exc:
-        logger.error(f"Ошибка запроса к AQICN API: {exc}")
+    report_data = fuse(
+        observations, time.time(), {source.name: source.weight for source in sources},
+        {source.name for source in sources if source.reference}
+    )
+    if report_data is None:
+        if quota_exhausted:
+            # Лимит запросов исчерпан: лучше устаревшие данные, чем превышение квоты токена
+            logger.warning("Квота запросов к AQICN исчерпана, используются данные из кэша.")
+            return air_quality_cache.get(cache_key, max_age=float("inf"))
         return None
-    except httpx.HTTPStatusError as exc:
-        logger.error(f"Ошибка HTTP статуса от AQICN API: {exc.response.status_code} - {exc.response.text}")
-        return None
-    except Exception as e:
-        logger.error(f"Неожиданная ошибка при получении данных AQICN: {e}", exc_info=True)
-        return None
\ No newline at end of file
+
+    air_quality_cache.set(cache_key, report_data)
+    if not record_history:
+        return report_data
+    # Новое показание точки района сохраняется в историю для выгрузки (utils/export.py)
+    db.save_reading(
+        time.time(), *location_key(latitude, longitude), report_data["city_name"], report_data["overall_aqi"],
+        json.dumps(report_data["iaqi"], ensure_ascii=False), ",".join(report_data["sources"])
+    )
+    return report_data
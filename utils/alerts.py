@@ -0,0 +1,145 @@
+# utils/alerts.py
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import logging
+
+from utils.aqi import AQI_CATEGORY_BOUNDS, classify_many
+from utils.cache import location_key
+
+logger = logging.getLogger(__name__)
+
+# Состояния подписки
+STATE_NORMAL = "normal"
+STATE_ALERT = "alert"
+
+# События, о которых уведомляется пользователь
+EVENT_ENTERED = "entered"      # AQI впервые превысил порог
+EVENT_ESCALATED = "escalated"  # AQI перешел в более опасную категорию
+EVENT_RECOVERED = "recovered"  # AQI вернулся ниже порога (с учетом гистерезиса)
+EVENT_DIGEST = "digest"        # Ежедневная сводка
+
+# Насколько AQI должен опуститься ниже порога, чтобы считать ситуацию нормализовавшейся.
+# Без этого запаса колебания вокруг порога вызывают поток уведомлений.
+HYSTERESIS_BAND = 10
+# Минимальный интервал между тревожными уведомлениями одному пользователю (секунды)
+MIN_REALERT_INTERVAL = 3 * 60 * 60
+# Минимальный интервал перед уведомлением об ухудшении при уже активной тревоге (секунды)
+MIN_ESCALATION_INTERVAL = 60 * 60
+# Допустимый порог подписки: шкала AQI заканчивается на 500
+MAX_AQI_THRESHOLD = 500
+# AQI, начиная с которого уведомления отправляются даже в тихие часы
+QUIET_HOURS_OVERRIDE_AQI = 301
+
+DEFAULT_TIMEZONE = "Asia/Bishkek"
+DEFAULT_QUIET_START = 23  # час начала тихих часов (локальное время)
+DEFAULT_QUIET_END = 7     # час окончания тихих часов (локальное время)
+DIGEST_HOUR = 8           # час отправки ежедневной сводки (локальное время)
+
+_tz_cache = {}
+
+
+def _get_timezone(name: str | None) -> ZoneInfo:
+    name = name or DEFAULT_TIMEZONE
+    tz = _tz_cache.get(name)
+    if tz is None:
+        try:
+            tz = ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            logger.warning(f"Неизвестный часовой пояс '{name}', используется {DEFAULT_TIMEZONE}.")
+            tz = ZoneInfo(DEFAULT_TIMEZONE)
+        _tz_cache[name] = tz
+    return tz
+
+
+def local_time(now: float, tz_name: str | None) -> datetime:
+    """Переводит UNIX-время в локальное время пользователя."""
+    return datetime.fromtimestamp(now, tz=timezone.utc).astimezone(_get_timezone(tz_name))
+
+
+def is_quiet_hour(hour: int, quiet_start: int | None, quiet_end: int | None) -> bool:
+    """Проверяет, попадает ли час в тихие часы (интервал может переходить через полночь)."""
+    start = DEFAULT_QUIET_START if quiet_start is None else quiet_start
+    end = DEFAULT_QUIET_END if quiet_end is None else quiet_end
+    if start == end:
+        return False
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def _recovery_level(threshold: int, last_category: int) -> int:
+    """Уровень AQI, ниже которого тревога снимается."""
+    if threshold > 0:
+        # Для малых порогов полоса сужается, иначе уровень был бы <= 0 и тревога не снималась бы
+        return threshold - min(HYSTERESIS_BAND, threshold // 2)
+    # Для порога 0 ("все существенные изменения") отслеживается смена категории
+    if last_category == 0:
+        return 0
+    return AQI_CATEGORY_BOUNDS[last_category - 1] + 1 - HYSTERESIS_BAND
+
+
+def evaluate_alert(sub: dict, aqi: int, category: int, now: float) -> str | None:
+    """
+    Определяет, какое событие (если есть) нужно отправить подписчику.
+    sub — словарь подписки из database.db, category — индекс категории AQI.
+    """
+    threshold = sub['aqi_threshold'] or 0
+    state = sub.get('alert_state') or STATE_NORMAL
+    last_aqi = sub['last_notified_aqi']
+    last_at = sub.get('last_notified_at') or 0
+    last_category = classify_many((last_aqi,))[0] if last_aqi is not None else None
+
+    if state == STATE_NORMAL:
+        if threshold > 0:
+            if aqi >= threshold and now - last_at >= MIN_REALERT_INTERVAL:
+                return EVENT_ENTERED
+        elif category > 0 and (last_category is None or category > last_category):
+            return EVENT_ENTERED
+        return None
+
+    if aqi < _recovery_level(threshold, last_category or 0):
+        return EVENT_RECOVERED
+    if last_category is not None and category > last_category and now - last_at >= MIN_ESCALATION_INTERVAL:
+        return EVENT_ESCALATED
+    return None
+
+
+def evaluate_subscriptions(subscriptions: list[dict], readings: dict, now: float) -> list[tuple[dict, str, int]]:
+    """
+    Оценивает все подписки по показаниям станций.
+    readings — словарь {location_key(...): AQI}.
+    Возвращает список (подписка, событие, AQI) для отправки.
+    """
+    keys = [location_key(sub['latitude'], sub['longitude']) for sub in subscriptions]
+    values = [readings.get(key) for key in keys]
+    categories = classify_many(v if v is not None else 0 for v in values)
+
+    events = []
+    for sub, aqi, category in zip(subscriptions, values, categories):
+        if aqi is None:
+            continue
+
+        local = local_time(now, sub.get('timezone'))
+        quiet = is_quiet_hour(local.hour, sub.get('quiet_start'), sub.get('quiet_end'))
+        event = evaluate_alert(sub, aqi, category, now)
+
+        if event is not None and quiet and aqi < QUIET_HOURS_OVERRIDE_AQI:
+            # Событие откладывается: состояние не меняется, и оно повторится после тихих часов
+            event = None
+
+        if event is None and not quiet and (sub['aqi_threshold'] or 0) == 0 \
+                and local.hour >= DIGEST_HOUR and sub.get('last_digest_date') != local.date().isoformat():
+            event = EVENT_DIGEST
+
+        if event is not None:
+            events.append((sub, event, aqi))
+    return events
+
+
+def next_state(sub: dict, event: str) -> str:
+    """Возвращает новое состояние подписки после отправки события."""
+    if event in (EVENT_ENTERED, EVENT_ESCALATED):
+        return STATE_ALERT
+    if event == EVENT_RECOVERED:
+        return STATE_NORMAL
+    return sub.get('alert_state') or STATE_NORMAL
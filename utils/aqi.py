@@ -0,0 +1,111 @@
+# utils/aqi.py
+from bisect import bisect_left
+import math
+
+# Верхние границы категорий AQI (включительно) и соответствующие им категории.
+# Индекс в AQI_CATEGORIES находится бинарным поиском по AQI_CATEGORY_BOUNDS.
+AQI_CATEGORY_BOUNDS = (50, 100, 150, 200, 300)
+
+AQI_CATEGORIES = (
+    ("Хорошо", "🟢"),
+    ("Умеренно", "🟡"),
+    ("Неблагоприятно для чувствительных групп", "🟠"),
+    ("Неблагоприятно", "🔴"),
+    ("Очень неблагоприятно", "🟣"),
+    ("Опасно", "🟤"),
+)
+
+AQI_RECOMMENDATIONS = (
+    "Качество воздуха хорошее. Наслаждайтесь активностями на свежем воздухе!",
+    "Качество воздуха умеренное. Чувствительным людям стоит ограничить длительные нагрузки на улице.",
+    "Неблагоприятно для чувствительных групп. Людям с заболеваниями дыхания и сердца, детям и пожилым следует сократить время на улице.",
+    "Качество воздуха неблагоприятное. Избегайте длительного нахождения на улице, особенно при физических нагрузках. Закройте окна.",
+    "Очень неблагоприятное. Старайтесь оставаться дома, используйте очистители воздуха. На улице используйте респираторы.",
+    "Качество воздуха опасно! Максимально сократите время нахождения на улице. Используйте защиту органов дыхания. Закройте окна, включите очистители.",
+)
+
+# Диапазоны индекса, соответствующие строкам таблиц концентраций ниже.
+_INDEX_RANGES = ((0, 50), (51, 100), (101, 150), (151, 200), (201, 300), (301, 500))
+
+# Таблицы US EPA: верхние границы концентраций для каждого диапазона индекса
+# и число знаков после запятой, до которого усекается концентрация.
+# Единицы: PM2.5/PM10 — мкг/м³, O3 (8 ч) и CO — ppm, SO2 и NO2 — ppb.
+EPA_BREAKPOINTS = {
+    "pm25": ((0.0, 9.0, 35.4, 55.4, 125.4, 225.4, 325.4), 1),
+    "pm10": ((0, 54, 154, 254, 354, 424, 604), 0),
+    "o3": ((0.000, 0.054, 0.070, 0.085, 0.105, 0.200, 0.604), 3),
+    "co": ((0.0, 4.4, 9.4, 12.4, 15.4, 30.4, 50.4), 1),
+    "so2": ((0, 35, 75, 185, 304, 604, 1004), 0),
+    "no2": ((0, 53, 100, 360, 649, 1249, 2049), 0),
+}
+
+# Синонимы названий загрязнителей (в отчетах API используются "PM2.5", "PM10" и т.п.)
+_POLLUTANT_ALIASES = {"pm2.5": "pm25"}
+
+
+def get_aqi_category(aqi: float) -> tuple[str, str]:
+    """Возвращает категорию и эмодзи для AQI."""
+    return AQI_CATEGORIES[bisect_left(AQI_CATEGORY_BOUNDS, aqi)]
+
+
+def get_basic_recommendations(aqi: float) -> str:
+    """Возвращает базовые рекомендации на основе AQI."""
+    return AQI_RECOMMENDATIONS[bisect_left(AQI_CATEGORY_BOUNDS, aqi)]
+
+
+def classify_many(values) -> list[int]:
+    """
+    Классифицирует последовательность значений AQI за один проход.
+    Возвращает список индексов категорий (индексы в AQI_CATEGORIES).
+    """
+    bounds = AQI_CATEGORY_BOUNDS
+    return [bisect_left(bounds, value) for value in values]
+
+
+def _truncate(value: float, digits: int) -> float:
+    factor = 10 ** digits
+    # Небольшой допуск компенсирует ошибки представления float (например, 35.4 * 10)
+    return math.floor(value * factor + 1e-9) / factor
+
+
+def compute_sub_index(pollutant: str, concentration: float) -> int | None:
+    """
+    Вычисляет суб-индекс AQI по концентрации загрязнителя (формула US EPA).
+    Возвращает None для неизвестного загрязнителя или отрицательной концентрации.
+    Значения выше верхней границы таблицы ограничиваются индексом 500.
+    """
+    key = pollutant.lower()
+    key = _POLLUTANT_ALIASES.get(key, key)
+    table = EPA_BREAKPOINTS.get(key)
+    if table is None or concentration is None or concentration < 0:
+        return None
+
+    bounds, digits = table
+    c = _truncate(concentration, digits)
+    if c > bounds[-1]:
+        return 500
+
+    # bounds[0] — нижняя граница первого диапазона, поэтому ищем среди верхних границ
+    i = max(bisect_left(bounds, c, 1) - 1, 0)
+    c_lo = 0 if i == 0 else bounds[i] + 10 ** -digits
+    c_hi = bounds[i + 1]
+    i_lo, i_hi = _INDEX_RANGES[i]
+    if c < c_lo:
+        # Концентрация попала в "зазор" между диапазонами из-за усечения
+        c = c_lo
+    return round((i_hi - i_lo) / (c_hi - c_lo) * (c - c_lo) + i_lo)
+
+
+def compute_aqi(concentrations: dict) -> tuple[int | None, dict]:
+    """
+    Вычисляет общий AQI по словарю {загрязнитель: концентрация}.
+    Возвращает кортеж (общий AQI, словарь суб-индексов); общий AQI — максимум суб-индексов.
+    """
+    sub_indices = {}
+    for pollutant, concentration in concentrations.items():
+        sub_index = compute_sub_index(pollutant, concentration)
+        if sub_index is not None:
+            sub_indices[pollutant] = sub_index
+    if not sub_indices:
+        return None, sub_indices
+    return max(sub_indices.values()), sub_indices
@@ -0,0 +1,77 @@
+# utils/batch_lookup.py
+import asyncio
+import re
+
+from utils.air_quality_api import get_air_quality_data
+from utils.cache import location_key
+from utils.geo_utils import geocode_address
+
+# Максимальное число мест в одном сообщении
+MAX_BATCH_LOCATIONS = 10
+
+_SEPARATORS = re.compile(r"[,;\n]+")
+# Часть, состоящая только из номера дома ("100", "12а", "5/1", "7-б")
+_HOUSE_NUMBER = re.compile(r"^\d+[\w/-]?\w*$")
+
+
+def split_locations(text: str) -> list[str]:
+    """
+    Разбивает сообщение на список мест ("Джал, Восток-5; Асанбай").
+    Повторы убираются без учета регистра, порядок сохраняется.
+    """
+    parts = []
+    for part in _SEPARATORS.split(text):
+        name = " ".join(part.split())
+        if not name:
+            continue
+        if parts and _HOUSE_NUMBER.match(name):
+            # "ул. Токтогула, 100" — номер дома относится к предыдущей части адреса
+            parts[-1] = f"{parts[-1]}, {name}"
+        else:
+            parts.append(name)
+
+    names = []
+    seen = set()
+    for name in parts:
+        if name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+async def lookup_many(names: list[str]) -> list[dict]:
+    """
+    Находит AQI для нескольких мест сразу.
+    Геокодирование выполняется параллельно (промахи кэша все равно проходят через ограничитель
+    частоты Nominatim), а данные о качестве воздуха запрашиваются по одному разу для каждой
+    различной локации. Возвращает список словарей, отсортированный по убыванию AQI;
+    места без данных идут в конце с aqi=None.
+    """
+    names = names[:MAX_BATCH_LOCATIONS]
+    geocoded = await asyncio.gather(*(geocode_address(name, limit=1) for name in names))
+
+    locations = {}
+    for results in geocoded:
+        if results:
+            latitude, longitude, _ = results[0]
+            locations.setdefault(location_key(latitude, longitude), (latitude, longitude))
+
+    keys = list(locations)
+    air_data = await asyncio.gather(*(get_air_quality_data(*locations[key]) for key in keys))
+    air_data_by_key = dict(zip(keys, air_data))
+
+    rows = []
+    for name, results in zip(names, geocoded):
+        row = {"name": name, "address": None, "station": None, "aqi": None}
+        if results:
+            latitude, longitude, address = results[0]
+            row["address"] = address
+            data = air_data_by_key.get(location_key(latitude, longitude))
+            # WAQI возвращает "-", если у станции нет текущих данных
+            if data and isinstance(data.get('overall_aqi'), (int, float)):
+                row["aqi"] = data['overall_aqi']
+                row["station"] = data.get('city_name')
+        rows.append(row)
+
+    rows.sort(key=lambda row: (row["aqi"] is None, -(row["aqi"] or 0)))
+    return rows
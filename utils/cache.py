@@ -0,0 +1,93 @@
+# utils/cache.py
+import json
+import logging
+import time
+
+from database import db
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def location_key(latitude: float, longitude: float) -> tuple[float, float]:
+    """Ключ для группировки запросов по локации (~100 м), чтобы запрашивать данные один раз."""
+    return round(latitude, 3), round(longitude, 3)
+
+
+class TTLCache:
+    """
+    Кэш в памяти с временем жизни записей и сохранением на диск (таблица cache в БД).
+    Чтение всегда идет из памяти; диск используется только для прогрева после перезапуска.
+    В памяти хранится не больше max_entries записей: при переполнении вытесняются
+    давно не использованные (LRU). Устаревшие записи не удаляются сразу — они нужны
+    как запасной вариант (get с max_age), но вытесняются первыми, потому что не читаются.
+    """
+
+    def __init__(self, namespace: str, ttl: float, max_entries: int = 10_000):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (updated_at, value); порядок — от давно использованных к недавним
+        self._hits = 0
+        self._misses = 0
+        metrics.cache_requests_total.set_function(lambda: self._hits, cache=namespace, result="hit")
+        metrics.cache_requests_total.set_function(lambda: self._misses, cache=namespace, result="miss")
+
+    def get(self, key: str, max_age: float | None = None):
+        """Возвращает значение или None, если записи нет или она устарела."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        updated_at, value = entry
+        if time.time() - updated_at > (self.ttl if max_age is None else max_age):
+            self._misses += 1
+            return None
+        self._hits += 1
+        # Запись перемещается в конец порядка вытеснения
+        del self._entries[key]
+        self._entries[key] = entry
+        return value
+
+    def _store(self, key: str, entry: tuple) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def set(self, key: str, value, persist: bool = True) -> None:
+        now = time.time()
+        self._store(key, (now, value))
+        if persist:
+            db.save_cache_entry(self.namespace, key, json.dumps(value, ensure_ascii=False), now)
+
+    def load_from_disk(self) -> int:
+        """Загружает из БД неустаревшие записи. Возвращает число загруженных записей."""
+        min_updated_at = time.time() - self.ttl
+        db.purge_cache_entries(self.namespace, min_updated_at)
+        loaded = 0
+        for key, value, updated_at in db.load_cache_entries(self.namespace, min_updated_at):
+            try:
+                self._store(key, (updated_at, json.loads(value)))
+                loaded += 1
+            except ValueError:
+                logger.warning(f"Повреждена запись кэша {self.namespace}/{key}, пропускаю.")
+        return loaded
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Данные WAQI обновляются примерно раз в час; ключи — локации подписок, районов и запросов пользователей
+air_quality_cache = TTLCache("air_quality", ttl=30 * 60, max_entries=50_000)
+# Координаты районов и улиц практически не меняются; ключи — произвольный текст пользователей
+geocode_cache = TTLCache("geocode", ttl=30 * 24 * 60 * 60, max_entries=20_000)
+
+
+def air_quality_key(latitude: float, longitude: float) -> str:
+    lat, lon = location_key(latitude, longitude)
+    return f"{lat:.3f},{lon:.3f}"
+
+
+def geocode_key(address: str, limit: int) -> str:
+    return f"{limit}|{' '.join(address.lower().split())}"
@@ -0,0 +1,135 @@
+# utils/district_index.py
+import logging
+import re
+import time
+from bisect import bisect_left
+
+from utils.air_quality_api import get_air_quality_data
+from utils.aqi import get_aqi_category
+
+logger = logging.getLogger(__name__)
+
+# Справочник районов и жилмассивов Бишкека (приблизительные координаты центров)
+BISHKEK_DISTRICTS = [
+    ("Центр (пл. Ала-Тоо)", 42.8765, 74.6039),
+    ("Ошский рынок", 42.8748, 74.5747),
+    ("Аламединский рынок", 42.8800, 74.6280),
+    ("Джал", 42.8350, 74.5750),
+    ("Верхний Джал", 42.8170, 74.5650),
+    ("Восток-5", 42.8360, 74.6370),
+    ("Асанбай", 42.8230, 74.6150),
+    ("Кок-Жар", 42.8190, 74.6250),
+    ("Магистраль", 42.8380, 74.6100),
+    ("Ортосай", 42.8200, 74.5850),
+    ("10 микрорайон", 42.8500, 74.6040),
+    ("11 микрорайон", 42.8470, 74.6000),
+    ("12 микрорайон", 42.8450, 74.6150),
+    ("Тунгуч", 42.8400, 74.6550),
+    ("Аламедин-1", 42.8600, 74.6400),
+    ("Кызыл-Аскер", 42.8700, 74.6500),
+    ("Бакай-Ата", 42.8880, 74.6900),
+    ("Ак-Орго", 42.9030, 74.5670),
+    ("Арча-Бешик", 42.9050, 74.5250),
+    ("Кара-Жыгач", 42.9050, 74.6400),
+    ("Дордой", 42.9370, 74.6270),
+]
+
+# Как часто пересчитывается индекс (секунды)
+REFRESH_INTERVAL = 15 * 60
+
+_WORD_SPLIT = re.compile(r"[\s\-()]+")
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().replace("ё", "е").split())
+
+
+class DistrictIndex:
+    """
+    Индекс районов в памяти: последние значения AQI и префиксный поиск по названию.
+    Используется в инлайн-режиме, где запросы приходят на каждое нажатие клавиши,
+    поэтому поиск никогда не обращается к внешним API.
+    """
+
+    def __init__(self, districts=BISHKEK_DISTRICTS):
+        self.districts = [
+            {"name": name, "latitude": lat, "longitude": lon, "aqi": None, "station": None, "time": None}
+            for name, lat, lon in districts
+        ]
+        # Отсортированные пары (токен, индекс района): полное название и каждое слово
+        tokens = set()
+        for i, district in enumerate(self.districts):
+            normalized = normalize(district["name"])
+            tokens.add((normalized, i))
+            for word in _WORD_SPLIT.split(normalized):
+                if word:
+                    tokens.add((word, i))
+        self._tokens = sorted(tokens)
+        self._token_keys = [token for token, _ in self._tokens]
+        self._search_cache = {}
+        self.updated_at = None
+
+    def update(self, readings: dict) -> None:
+        """Обновляет AQI районов. readings — {индекс района: данные get_air_quality_data}."""
+        for i, air_data in readings.items():
+            aqi = air_data.get('overall_aqi')
+            if isinstance(aqi, (int, float)):
+                self.districts[i].update(aqi=aqi, station=air_data.get('city_name'), time=air_data.get('local_time'))
+        self._search_cache.clear()
+        self.updated_at = time.time()
+
+    def leaderboard(self, limit: int = 10) -> list[dict]:
+        """Районы с известным AQI, от самого загрязненного к самому чистому."""
+        known = [d for d in self.districts if d["aqi"] is not None]
+        return sorted(known, key=lambda d: -d["aqi"])[:limit]
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        """Префиксный поиск по названию района или любому слову в нем; пустой запрос — рейтинг."""
+        prefix = normalize(query)
+        if not prefix:
+            return self.leaderboard(limit)
+        cache_key = (prefix, limit)
+        cached = self._search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        found = []
+        seen = set()
+        position = bisect_left(self._token_keys, prefix)
+        while position < len(self._tokens) and self._token_keys[position].startswith(prefix):
+            i = self._tokens[position][1]
+            if i not in seen:
+                seen.add(i)
+                found.append(self.districts[i])
+            position += 1
+        found.sort(key=lambda d: (d["aqi"] is None, -(d["aqi"] or 0)))
+        result = found[:limit]
+        self._search_cache[cache_key] = result
+        return result
+
+
+district_index = DistrictIndex()
+
+
+async def refresh_district_index(context=None) -> None:
+    """
+    Пересчитывает индекс районов (задание JobQueue). Данные берутся через кэш показаний;
+    новые показания районов сохраняются в историю для выгрузки (utils/export.py).
+    """
+    started = time.perf_counter()
+    readings = {}
+    for i, district in enumerate(district_index.districts):
+        air_data = await get_air_quality_data(district["latitude"], district["longitude"], record_history=True)
+        if air_data:
+            readings[i] = air_data
+    district_index.update(readings)
+    logger.info(f"Индекс районов обновлен: {len(readings)} из {len(district_index.districts)} "
+                f"за {time.perf_counter() - started:.1f} с.")
+
+
+def describe(district: dict) -> str:
+    """Краткое описание района для результатов поиска."""
+    if district["aqi"] is None:
+        return "Нет данных"
+    category, emoji = get_aqi_category(district["aqi"])
+    return f"{emoji} AQI {district['aqi']} — {category}"
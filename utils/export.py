@@ -0,0 +1,330 @@
+# utils/export.py
+"""
+Выгрузка истории показаний и суточной статистики по районам в CSV, NDJSON и Parquet.
+
+Данные читаются из таблицы readings генераторами и кодируются порциями,
+поэтому память не зависит от длины периода. В истории и выгрузке — только точки районов
+(utils/district_index.py), без координат пользователей. Используется HTTP-эндпоинтом
+(/export/readings, /export/districts на внутреннем порту метрик, только с EXPORT_TOKEN,
+не больше MAX_HTTP_EXPORT_DAYS за запрос) и из командной строки:
+
+    python -m utils.export readings --from 2024-01-01 --to 2025-01-01 --format csv --output readings.csv
+    python -m utils.export districts --from 2024-01-01 --to 2025-01-01 --format ndjson
+"""
+import argparse
+import asyncio
+import csv
+import hmac
+import io
+import json
+import logging
+import sys
+from datetime import datetime, timezone
+from urllib.parse import parse_qs
+from zoneinfo import ZoneInfo
+
+from config import EXPORT_TOKEN
+from database import db
+from utils.alerts import DEFAULT_TIMEZONE, local_time
+from utils.cache import location_key
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson", "parquet")
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# (имя колонки, тип Parquet)
+READING_FIELDS = [
+    ("time", "string"), ("latitude", "float64"), ("longitude", "float64"), ("station", "string"),
+    ("aqi", "int64"), ("pm25", "float64"), ("pm10", "float64"), ("sources", "string"),
+]
+DISTRICT_FIELDS = [
+    ("date", "string"), ("district", "string"), ("latitude", "float64"), ("longitude", "float64"),
+    ("readings", "int64"), ("aqi_min", "int64"), ("aqi_mean", "float64"), ("aqi_max", "int64"),
+]
+
+# Сколько строк кодируется в один фрагмент ответа (CSV, NDJSON) и в одну группу строк Parquet
+CHUNK_ROWS = 1000
+PARQUET_ROW_GROUP = 50_000
+# Наибольший период одной HTTP-выгрузки (дни)
+MAX_HTTP_EXPORT_DAYS = 366
+
+
+class ExportError(ValueError):
+    """Некорректные параметры выгрузки."""
+
+
+def parse_time(value: str) -> float:
+    """Дата (YYYY-MM-DD) или время в ISO 8601; без часового пояса — время Бишкека."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f"Некорректная дата: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=ZoneInfo(DEFAULT_TIMEZONE))
+    return parsed.timestamp()
+
+
+def _utc_offset(start: float) -> int:
+    # Сутки статистики — в часовом поясе Бишкека (смещение на начало периода)
+    return int(local_time(start, None).utcoffset().total_seconds())
+
+
+def district_points() -> dict:
+    """{location_key точки района: название} — единственные точки, которые попадают в историю и выгрузку."""
+    from utils.district_index import BISHKEK_DISTRICTS
+
+    return {location_key(lat, lon): name for name, lat, lon in BISHKEK_DISTRICTS}
+
+
+def reading_rows(start: float, end: float, location: tuple[float, float] | None = None):
+    """Строки показаний точек районов (или одной точки района) в порядке READING_FIELDS."""
+    locations = [location] if location is not None else list(district_points())
+    for recorded_at, latitude, longitude, station, aqi, iaqi, sources in db.iter_readings(start, end, locations):
+        pollutants = json.loads(iaqi) if iaqi else {}
+        yield (
+            datetime.fromtimestamp(recorded_at, timezone.utc).isoformat(timespec="seconds"),
+            latitude, longitude, station, aqi, pollutants.get("PM2.5"), pollutants.get("PM10"), sources,
+        )
+
+
+def district_rows(start: float, end: float):
+    """Суточная статистика по районам из utils.district_index в порядке DISTRICT_FIELDS."""
+    names = district_points()
+    for day, latitude, longitude, count, aqi_min, aqi_mean, aqi_max in db.iter_daily_stats(
+            start, end, list(names), _utc_offset(start)):
+        yield day, names.get((latitude, longitude)), latitude, longitude, count, aqi_min, aqi_mean, aqi_max
+
+
+def encode_csv(fields: list, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(name for name, _ in fields)
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= CHUNK_ROWS:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def encode_ndjson(fields: list, rows):
+    names = [name for name, _ in fields]
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(names, row)), ensure_ascii=False))
+        if len(lines) >= CHUNK_ROWS:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class _ChunkSink:
+    """
+    Поток для pyarrow.parquet.ParquetWriter, отдающий записанное порциями.
+    Позиция считается от начала файла, потому что Parquet хранит смещения групп строк в футере.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def encode_parquet(fields: list, rows):
+    # pyarrow — необязательная зависимость, нужна только для Parquet
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in fields])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    columns = [[] for _ in fields]
+
+    def write_group():
+        writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+        ))
+        for column in columns:
+            column.clear()
+
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+        if len(columns[0]) >= PARQUET_ROW_GROUP:
+            write_group()
+            yield sink.take()
+    if columns[0]:
+        write_group()
+    writer.close()
+    yield sink.take()
+
+
+_ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson, "parquet": encode_parquet}
+
+
+def export(kind: str, fmt: str, start: float, end: float, location: tuple[float, float] | None = None):
+    """
+    Генератор фрагментов (bytes) выгрузки.
+    kind — "readings" (показания) или "districts" (суточная статистика по районам).
+    """
+    if fmt not in FORMATS:
+        raise ExportError(f"Неизвестный формат: {fmt}. Доступны: {', '.join(FORMATS)}")
+    if fmt == "parquet" and not parquet_available():
+        raise ExportError("Для выгрузки в Parquet установите pyarrow.")
+    if end <= start:
+        raise ExportError("Конец периода должен быть позже начала.")
+    if location is not None and location not in district_points():
+        raise ExportError("Выгрузка доступна только для точек районов (utils/district_index.py).")
+    if kind == "readings":
+        return _ENCODERS[fmt](READING_FIELDS, reading_rows(start, end, location))
+    if kind == "districts":
+        return _ENCODERS[fmt](DISTRICT_FIELDS, district_rows(start, end))
+    raise ExportError(f"Неизвестный тип выгрузки: {kind}")
+
+
+def export_from_query(kind: str, query_string: str):
+    """Разбирает параметры HTTP-запроса (from, to, format, lat, lon) и возвращает (формат, генератор)."""
+    query = {key: values[0] for key, values in parse_qs(query_string).items()}
+    if "from" not in query or "to" not in query:
+        raise ExportError("Укажите период: ?from=YYYY-MM-DD&to=YYYY-MM-DD")
+    fmt = query.get("format", "csv")
+    location = None
+    if "lat" in query or "lon" in query:
+        try:
+            location = location_key(float(query["lat"]), float(query["lon"]))
+        except (KeyError, ValueError):
+            raise ExportError("Укажите обе координаты: lat и lon.")
+    start, end = parse_time(query["from"]), parse_time(query["to"])
+    if end - start > MAX_HTTP_EXPORT_DAYS * 24 * 60 * 60:
+        raise ExportError(f"Период одной выгрузки — не больше {MAX_HTTP_EXPORT_DAYS} дней.")
+    return fmt, export(kind, fmt, start, end, location)
+
+
+def _authorized(headers: dict) -> bool:
+    if not EXPORT_TOKEN:
+        return False
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), EXPORT_TOKEN.encode())
+
+
+async def _write_error(writer, status: str, message: str) -> None:
+    payload = f"{message}\n".encode("utf-8")
+    writer.write(
+        f"HTTP/1.1 {status}\r\nContent-Type: text/plain; charset=utf-8\r\n"
+        f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+    )
+    await writer.drain()
+
+
+async def write_http_export(writer, path: str, query_string: str, headers: dict) -> None:
+    """
+    Отвечает на GET /export/<kind> потоковой выгрузкой (Transfer-Encoding: chunked).
+    headers — заголовки запроса (имена в нижнем регистре); нужен Authorization: Bearer EXPORT_TOKEN.
+    """
+    if not _authorized(headers):
+        await _write_error(
+            writer, "403 Forbidden", "Выгрузка недоступна: нужен заголовок Authorization: Bearer <EXPORT_TOKEN>."
+        )
+        return
+    kind = path[len("/export/"):].strip("/")
+    try:
+        fmt, chunks = export_from_query(kind, query_string)
+    except ExportError as e:
+        await _write_error(writer, "400 Bad Request", str(e))
+        return
+
+    writer.write(
+        f"HTTP/1.1 200 OK\r\nContent-Type: {CONTENT_TYPES[fmt]}\r\n"
+        f"Content-Disposition: attachment; filename=\"{kind}.{fmt}\"\r\n"
+        "Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n".encode("latin-1")
+    )
+    # Следующая порция читается из БД только после того, как клиент принял предыдущую.
+    # Чтение и кодирование выполняются в потоке, чтобы не блокировать цикл событий бота
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+                await writer.drain()
+    except Exception as e:
+        # Без завершающего фрагмента клиент увидит обрыв соединения, а не полную выгрузку
+        logger.error(f"Выгрузка {kind} прервана: {e}")
+        chunks.close()
+        writer.transport.abort()
+        return
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Выгрузка истории качества воздуха")
+    parser.add_argument("kind", choices=("readings", "districts"))
+    parser.add_argument("--from", dest="start", required=True, help="начало периода (YYYY-MM-DD или ISO 8601)")
+    parser.add_argument("--to", dest="end", required=True, help="конец периода, не включая")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--lat", type=float, help="широта точки района (только для readings)")
+    parser.add_argument("--lon", type=float, help="долгота точки района (только для readings)")
+    parser.add_argument("--output", help="файл для выгрузки (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    location = location_key(args.lat, args.lon) if args.lat is not None and args.lon is not None else None
+    try:
+        chunks = export(args.kind, args.format, parse_time(args.start), parse_time(args.end), location)
+    except ExportError as e:
+        parser.error(str(e))
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
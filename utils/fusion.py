@@ -0,0 +1,112 @@
+# utils/fusion.py
+import logging
+from statistics import median
+
+logger = logging.getLogger(__name__)
+
+# Наблюдения старше этого возраста не учитываются, если есть более свежие
+MAX_OBSERVATION_AGE = 3 * 60 * 60
+# Вес наблюдения убывает вдвое за каждый такой интервал
+FRESHNESS_HALF_LIFE = 60 * 60
+# Отбраковка выбросов (при трех и более наблюдениях): отклонение от медианы больше
+# OUTLIER_MAD_FACTOR медианных абсолютных отклонений, но не меньше OUTLIER_MIN_DEVIATION единиц AQI
+OUTLIER_MAD_FACTOR = 3.0
+OUTLIER_MIN_DEVIATION = 25
+# Коэффициент, приводящий MAD к стандартному отклонению для нормального распределения
+_MAD_SCALE = 1.4826
+
+
+def _age(observation: dict, now: float) -> float:
+    # Время измерения неизвестно — наблюдение считается свежим
+    observed_at = observation.get("observed_at")
+    return max(0.0, now - observed_at) if observed_at is not None else 0.0
+
+
+def _weighted_median(values: list[tuple[float, float]]) -> float:
+    """Взвешенная медиана по парам (значение, вес): первое значение, на котором набирается половина веса."""
+    values = sorted(values)
+    half = sum(w for _, w in values) / 2
+    cumulative = 0.0
+    for value, w in values:
+        cumulative += w
+        if cumulative >= half:
+            return value
+    return values[-1][0]
+
+
+def _observation_weights(observations: list[dict], now: float, weights: dict) -> list[float]:
+    # Вес источника делится между его наблюдениями и умножается на свежесть
+    per_source = {}
+    for o in observations:
+        per_source[o["source"]] = per_source.get(o["source"], 0) + 1
+    return [
+        weights.get(o["source"], 1.0) / per_source[o["source"]] * 0.5 ** (_age(o, now) / FRESHNESS_HALF_LIFE)
+        for o in observations
+    ]
+
+
+def reject_outliers(observations: list[dict], observation_weights: list[float] | None = None,
+                    references=()) -> tuple[list[dict], list[dict]]:
+    """
+    Делит наблюдения на принятые и выбросы по взвешенным медиане и MAD. Возвращает (принятые, выбросы).
+    Медиана взвешена (observation_weights, по умолчанию веса равны), поэтому несколько народных датчиков
+    не перевешивают станцию. Единственное наблюдение эталонного источника (references) не отбраковывается.
+    """
+    if len(observations) < 3:
+        return observations, []
+    if observation_weights is None:
+        observation_weights = [1.0] * len(observations)
+    center = _weighted_median([(o["aqi"], w) for o, w in zip(observations, observation_weights)])
+    mad = _weighted_median([(abs(o["aqi"] - center), w) for o, w in zip(observations, observation_weights)])
+    limit = max(OUTLIER_MIN_DEVIATION, OUTLIER_MAD_FACTOR * _MAD_SCALE * mad)
+
+    reference_counts = {}
+    for o in observations:
+        if o["source"] in references:
+            reference_counts[o["source"]] = reference_counts.get(o["source"], 0) + 1
+    accepted, rejected = [], []
+    for o in observations:
+        if abs(o["aqi"] - center) <= limit or reference_counts.get(o["source"]) == 1:
+            accepted.append(o)
+        else:
+            rejected.append(o)
+    return accepted, rejected
+
+
+def fuse(observations: list[dict], now: float, weights: dict | None = None, references=()) -> dict | None:
+    """
+    Объединяет наблюдения разных источников для одной точки в отчет в формате get_air_quality_data.
+    1. Устаревшие наблюдения отбрасываются (если все устарели, берется самое свежее).
+    2. Выбросы отбраковываются по отклонению от взвешенной медианы; единственное наблюдение
+       эталонного источника (references, например станция WAQI) сохраняется всегда.
+    3. AQI — взвешенное среднее: вес источника (weights, делится между его наблюдениями,
+       чтобы десяток народных датчиков не перевесил станцию) умножается на свежесть.
+    Станция, время и суб-индексы берутся у наблюдения с наибольшим весом.
+    """
+    if not observations:
+        return None
+    weights = weights or {}
+
+    fresh = [o for o in observations if _age(o, now) <= MAX_OBSERVATION_AGE]
+    if not fresh:
+        fresh = [min(observations, key=lambda o: _age(o, now))]
+    accepted, rejected = reject_outliers(fresh, _observation_weights(fresh, now, weights), references)
+    if rejected:
+        described = ", ".join(f"{o['station']} ({o['aqi']})" for o in rejected)
+        logger.info(f"Отбраковано выбросов: {described}")
+
+    weighted = list(zip(_observation_weights(accepted, now, weights), accepted))
+    total = sum(w for w, _ in weighted)
+    if total <= 0:
+        return None
+    aqi = round(sum(w * o["aqi"] for w, o in weighted) / total)
+
+    # Суб-индексы загрязнителей берутся у лучшего наблюдения, где они есть
+    best = max(weighted, key=lambda item: (bool(item[1]["iaqi"]), item[0]))[1]
+    return {
+        "overall_aqi": aqi,
+        "city_name": best["station"],
+        "local_time": best["local_time"],
+        "iaqi": dict(best["iaqi"]),
+        "sources": sorted({o["source"] for o in accepted}),
+    }
@@ -1,17 +1,46 @@
 # utils/geo_utils.py
-import httpx
+import asyncio
 import logging
+import time
+from utils.cache import geocode_cache, geocode_key
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
 NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
 
+_nominatim_latency = metrics.upstream_duration.series(api="nominatim")
+
+# Политика использования Nominatim: не более одного запроса в секунду
+NOMINATIM_MIN_INTERVAL = 1.0
+_nominatim_lock = asyncio.Lock()
+_nominatim_last_request = 0.0
+
+
+async def _wait_for_nominatim_slot() -> None:
+    """Выдерживает интервал между запросами к Nominatim (ответы из кэша ограничение не тратят)."""
+    global _nominatim_last_request
+    async with _nominatim_lock:
+        delay = _nominatim_last_request + NOMINATIM_MIN_INTERVAL - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        _nominatim_last_request = time.monotonic()
+
+
 async def geocode_address(address: str, limit: int = 1): # <<< Добавляем параметр limit
     """
     Геокодирует адрес, используя Nominatim OpenStreetMap.
     Возвращает список кортежей (latitude, longitude, formatted_address)
     или пустой список, если адрес не найден.
+    Успешные результаты кэшируются (в памяти и в БД), чтобы не нагружать Nominatim.
     """
+    cache_key = geocode_key(address, limit)
+    cached = geocode_cache.get(cache_key)
+    if cached is not None:
+        return [tuple(item) for item in cached]
+
+    import httpx  # Импорт по требованию: httpx не нужен при старте и при проверке конфигурации
+
     params = {
         "q": f"{address}, Bishkek", # Уточняем поиск по Бишкеку
         "format": "json",
@@ -23,24 +52,34 @@ async def geocode_address(address: str, limit: int = 1): # <<< Добавляе
         "User-Agent": "BishkekEcoMonitorBot/1.0 (contact@example.com)" # Хорошая практика: указать User-Agent
     }
 
+    await _wait_for_nominatim_slot()
     try:
         async with httpx.AsyncClient() as client:
-            response = await client.get(NOMINATIM_URL, params=params, headers=headers, timeout=10)
+            started = time.perf_counter()
+            try:
+                response = await client.get(NOMINATIM_URL, params=params, headers=headers, timeout=10)
+            finally:
+                _nominatim_latency.observe(time.perf_counter() - started)
             response.raise_for_status() # Вызывает исключение для ошибок HTTP
             data = response.json()
 
             if data:
                 # Если limit > 1, возвращаем список всех найденных совпадений
-                return [(float(item['lat']), float(item['lon']), item['display_name']) for item in data]
+                results = [(float(item['lat']), float(item['lon']), item['display_name']) for item in data]
+                geocode_cache.set(cache_key, results)
+                return results
             else:
                 logger.info(f"Не удалось геокодировать адрес: {address}")
                 return []
     except httpx.RequestError as e:
+        metrics.upstream_errors_total.inc(api="nominatim")
         logger.error(f"Ошибка запроса к Nominatim для адреса '{address}': {e}")
         return []
     except httpx.HTTPStatusError as e:
+        metrics.upstream_errors_total.inc(api="nominatim")
         logger.error(f"HTTP ошибка от Nominatim для адреса '{address}': {e.response.status_code} - {e.response.text}")
         return []
     except Exception as e:
+        metrics.upstream_errors_total.inc(api="nominatim")
         logger.error(f"Неизвестная ошибка при геокодировании адреса '{address}': {e}")
         return []
\ No newline at end of file
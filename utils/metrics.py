@@ -0,0 +1,299 @@
+# utils/metrics.py
+import asyncio
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import time
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger("trace")
+
+# Границы корзин гистограмм задержек (секунды)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Структурированные трассировки (спаны) пишутся в логгер "trace", если включены
+TRACING_ENABLED = False
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Counter:
+    """Монотонно возрастающий счетчик с метками."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._functions = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _format_labels(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def set_function(self, function, **labels) -> None:
+        """Значение счетчика читается из функции при экспорте (для счетчиков, которые ведутся в другом месте)."""
+        self._functions[_format_labels(labels)] = function
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        values = dict(self._values)
+        for key, function in self._functions.items():
+            values[key] = function()
+        lines.extend(f"{self.name}{key} {value}" for key, value in values.items())
+        return lines
+
+
+class Gauge:
+    """Текущее значение (может задаваться функцией, вызываемой при экспорте)."""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value: float, **labels) -> None:
+        self._values[_format_labels(labels)] = value
+
+    def set_function(self, function, **labels) -> None:
+        self._functions[_format_labels(labels)] = function
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        values = dict(self._values)
+        for key, function in self._functions.items():
+            try:
+                values[key] = function()
+            except Exception as e:
+                logger.warning(f"Не удалось вычислить метрику {self.name}{key}: {e}")
+        lines.extend(f"{self.name}{key} {value}" for key, value in values.items())
+        return lines
+
+
+class HistogramSeries:
+    """Серия гистограммы для фиксированного набора меток."""
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Histogram:
+    """Гистограмма (например, задержек) с фиксированными корзинами."""
+
+    def __init__(self, name: str, description: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def series(self, **labels) -> HistogramSeries:
+        """
+        Возвращает (и создает при необходимости) серию для набора меток.
+        Серию стоит получать один раз и вызывать series.observe() в горячем пути.
+        """
+        key = _format_labels(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = HistogramSeries(self.buckets)
+        return series
+
+    def observe(self, value: float, **labels) -> None:
+        self.series(**labels).observe(value)
+
+    def totals(self) -> tuple[int, float]:
+        """Суммарное число наблюдений и их сумма по всем сериям."""
+        return (sum(series.count for series in self._series.values()),
+                sum(series.total for series in self._series.values()))
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for key, series in self._series.items():
+            inner = key[1:-1]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series.counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = f'{{{inner},le="{le}"}}' if inner else f'{{le="{le}"}}'
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{key} {series.total}")
+            lines.append(f"{self.name}_count{key} {series.count}")
+        return lines
+
+
+# --- Метрики приложения ---
+upstream_duration = Histogram("ecomonitor_upstream_duration_seconds", "Длительность запросов к внешним API")
+db_duration = Histogram("ecomonitor_db_duration_seconds", "Длительность операций с базой данных")
+handler_duration = Histogram("ecomonitor_handler_duration_seconds", "Длительность обработки обновлений")
+sweep_duration = Histogram("ecomonitor_notification_sweep_duration_seconds", "Длительность рассылки уведомлений",
+                           buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800))
+upstream_errors_total = Counter("ecomonitor_upstream_errors_total", "Ошибки запросов к внешним API")
+errors_total = Counter("ecomonitor_errors_total", "Число исключений в инструментированных вызовах")
+cache_requests_total = Counter("ecomonitor_cache_requests_total", "Обращения к кэшу (попадания и промахи)")
+notifications_sent_total = Counter("ecomonitor_notifications_sent_total", "Отправленные уведомления по событиям")
+active_subscriptions = Gauge("ecomonitor_active_subscriptions", "Число активных подписок")
+update_queue_size = Gauge("ecomonitor_update_queue_size", "Размер очереди входящих обновлений")
+
+REGISTRY = [
+    upstream_duration, upstream_errors_total, db_duration, handler_duration, sweep_duration, errors_total,
+    cache_requests_total, notifications_sent_total, active_subscriptions, update_queue_size,
+]
+
+
+def render_prometheus() -> str:
+    """Возвращает все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _emit_span(name: str, span_id: int, parent_id: int | None, started: float, duration: float, error: str | None):
+    trace_logger.info(json.dumps({
+        "span": name, "span_id": span_id, "parent_id": parent_id,
+        "start": started, "duration_ms": round(duration * 1000, 3), "error": error,
+    }, ensure_ascii=False))
+
+
+def timed(histogram: Histogram, **labels):
+    """
+    Декоратор: измеряет длительность вызова (sync или async) в гистограмме и считает исключения.
+    Серия гистограммы выбирается один раз при декорировании, поэтому накладные расходы
+    на вызов — два perf_counter и одна вставка в корзину. Спаны трассировки пишутся
+    только для асинхронных вызовов и только при TRACING_ENABLED.
+    """
+    series = histogram.series(**labels)
+    span_name = f"{histogram.name}{_format_labels(labels)}"
+
+    def decorator(function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                if TRACING_ENABLED:
+                    return await _traced_async(function, args, kwargs, series, span_name, histogram.name, labels)
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                except BaseException:
+                    errors_total.inc(metric=histogram.name, **labels)
+                    raise
+                finally:
+                    series.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except BaseException:
+                errors_total.inc(metric=histogram.name, **labels)
+                raise
+            finally:
+                series.observe(time.perf_counter() - started)
+        return wrapper
+
+    return decorator
+
+
+async def _traced_async(function, args, kwargs, series, span_name, metric_name, labels):
+    span_id = next(_span_ids)
+    parent_id = _current_span.get()
+    token = _current_span.set(span_id)
+    wall_started = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        return await function(*args, **kwargs)
+    except BaseException as e:
+        error = type(e).__name__
+        errors_total.inc(metric=metric_name, **labels)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        series.observe(duration)
+        _current_span.reset(token)
+        _emit_span(span_name, span_id, parent_id, wall_started, duration, error)
+
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, internal: bool = True) -> None:
+    """HTTP-запрос к серверу метрик; без internal (публичный порт) доступна только проверка /healthz."""
+    try:
+        request_line = await reader.readline()
+        headers = {}
+        while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        parts = request_line.decode("latin-1").split()
+        path, _, query = (parts[1] if len(parts) > 1 else "/").partition("?")
+        if internal and path.startswith("/export/") and parts[0] == "GET":
+            # Выгрузка истории показаний (только чтение), см. utils/export.py
+            from utils.export import write_http_export
+            await write_http_export(writer, path, query, headers)
+            return
+        if internal and path == "/metrics":
+            status, body = "200 OK", render_prometheus()
+        elif path in ("/", "/healthz"):
+            status, body = "200 OK", "ok\n"
+        else:
+            status, body = "404 Not Found", "not found\n"
+        payload = body.encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.warning(f"Ошибка при обработке запроса к /metrics: {e}")
+    finally:
+        writer.close()
+
+
+# Запущенные HTTP-серверы (держим ссылки, чтобы серверы не были собраны сборщиком мусора)
+metrics_server = None
+health_server = None
+
+
+async def start_metrics_server(port: int, host: str = "127.0.0.1") -> asyncio.AbstractServer:
+    """
+    Запускает HTTP-эндпоинт /metrics (формат Prometheus) в текущем цикле событий.
+    На том же порту доступна выгрузка истории: /export/readings и /export/districts.
+    По умолчанию сервер слушает только localhost: метрики и выгрузка не предназначены для публичного доступа.
+    """
+    global metrics_server
+    server = await asyncio.start_server(_handle_http, host, port)
+    metrics_server = server
+    logger.info(f"Эндпоинт метрик доступен на {host}:{port} (/metrics, /export/...).")
+    return server
+
+
+async def start_health_server(port: int, host: str = "0.0.0.0") -> asyncio.AbstractServer:
+    """Запускает публичную проверку /healthz (для веб-сервиса Render) без метрик и выгрузки."""
+    global health_server
+    server = await asyncio.start_server(functools.partial(_handle_http, internal=False), host, port)
+    health_server = server
+    logger.info(f"Проверка /healthz доступна на порту {port}.")
+    return server
@@ -0,0 +1,98 @@
+# utils/prefetch.py
+import asyncio
+import logging
+import time
+from datetime import time as dt_time
+from zoneinfo import ZoneInfo
+
+from utils.adaptive_polling import MIN_POLL_INTERVAL
+from utils.air_quality_api import get_air_quality_data
+from utils.cache import air_quality_cache, air_quality_key, geocode_cache, location_key
+from utils.subscriber_index import load_subscriber_index, subscriber_index
+
+logger = logging.getLogger(__name__)
+
+# Часы пик (утренние и вечерние поездки): кэш прогревается заранее
+PEAK_PREFETCH_TIMES = (
+    dt_time(7, 30, tzinfo=ZoneInfo("Asia/Bishkek")),
+    dt_time(17, 30, tzinfo=ZoneInfo("Asia/Bishkek")),
+)
+# Сколько запросов к WAQI выполняется одновременно при прогреве
+PREFETCH_CONCURRENCY = 5
+
+PROCESS_STARTED_AT = time.monotonic()
+_first_response_logged = False
+
+
+def load_caches_from_disk() -> None:
+    """Загружает сохраненные кэши геокодирования и показаний в память."""
+    started = time.perf_counter()
+    geocode_loaded = geocode_cache.load_from_disk()
+    air_loaded = air_quality_cache.load_from_disk()
+    logger.info(
+        f"Кэш прогрет с диска за {(time.perf_counter() - started) * 1000:.1f} мс: "
+        f"геокодирование — {geocode_loaded}, показания — {air_loaded}."
+    )
+
+
+async def prefetch_locations(locations, fresh_for: float = 0) -> int:
+    """
+    Обновляет данные о качестве воздуха для указанных координат.
+    Каждая локация (с точностью location_key) запрашивается один раз; локации, показание для которых
+    в кэше моложе fresh_for секунд, пропускаются. Возвращает число успешных запросов.
+    """
+    unique = {}
+    for latitude, longitude in locations:
+        unique.setdefault(location_key(latitude, longitude), (latitude, longitude))
+    if fresh_for > 0:
+        unique = {
+            key: (lat, lon) for key, (lat, lon) in unique.items()
+            if air_quality_cache.get(air_quality_key(lat, lon), max_age=fresh_for) is None
+        }
+
+    semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    async def fetch(latitude, longitude):
+        async with semaphore:
+            return await get_air_quality_data(latitude, longitude, force_refresh=True)
+
+    results = await asyncio.gather(*(fetch(lat, lon) for lat, lon in unique.values()))
+    return sum(1 for result in results if result)
+
+
+async def prefetch_subscription_locations(context=None, fresh_for: float = 0) -> None:
+    """Прогревает кэш показаний для всех локаций активных подписок (используется как задание JobQueue)."""
+    started = time.perf_counter()
+    # Локации берутся из индекса подписчиков в памяти, без чтения всех подписок из БД
+    if not subscriber_index.loaded:
+        load_subscriber_index()
+    fetched = await prefetch_locations(subscriber_index.locations().values(), fresh_for)
+    logger.info(f"Предзагрузка показаний: {fetched} локаций за {time.perf_counter() - started:.1f} с.")
+
+
+async def warm_up(application) -> None:
+    """
+    Прогрев при старте (post_init приложения): кэши с диска загружаются сразу,
+    а обновление показаний для подписок запускается в фоне, не задерживая старт.
+    Показания моложе MIN_POLL_INTERVAL, сохраненные до перезапуска, не запрашиваются повторно.
+    """
+    load_caches_from_disk()
+    application.create_task(prefetch_subscription_locations(fresh_for=MIN_POLL_INTERVAL))
+
+
+def schedule_peak_prefetch(job_queue) -> None:
+    """Планирует предзагрузку показаний перед часами пик."""
+    for prefetch_time in PEAK_PREFETCH_TIMES:
+        job_queue.run_daily(prefetch_subscription_locations, time=prefetch_time)
+
+
+async def log_first_response(update, context) -> None:
+    """
+    Логирует время от запуска процесса до первого ответа пользователю.
+    Регистрируется в группе после основных обработчиков, поэтому срабатывает по завершении ответа.
+    """
+    global _first_response_logged
+    if _first_response_logged:
+        return
+    _first_response_logged = True
+    logger.info(f"Первый ответ после запуска отправлен через {time.monotonic() - PROCESS_STARTED_AT:.2f} с.")
@@ -0,0 +1,81 @@
+# utils/quota.py
+import logging
+import time
+from collections import deque
+
+from config import AQICN_DAILY_QUOTA, AQICN_PER_SECOND_LIMIT
+from database import db
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaAccountant:
+    """
+    Учет запросов к API по скользящим окнам, например (10000 за сутки) и (1000 за секунду).
+    try_acquire() разрешает запрос, только если ни одно окно не будет превышено,
+    поэтому все обращения к API, проходящие через учет, гарантированно укладываются в лимит.
+    Если задано имя api, каждый запрос записывается в БД (таблица api_calls), а load_from_disk()
+    восстанавливает окна после перезапуска. Поэтому время — по часам системы (time.time), а не monotonic.
+    """
+
+    def __init__(self, limits: list[tuple[int, float]], clock=time.time, api: str | None = None):
+        self.limits = [(limit, window) for limit, window in limits if limit > 0]
+        self._clock = clock
+        self._windows = [deque() for _ in self.limits]
+        self.api = api
+        self.denied = 0
+
+    def _expire(self, now: float) -> None:
+        for (_, window), calls in zip(self.limits, self._windows):
+            while calls and calls[0] <= now - window:
+                calls.popleft()
+
+    def try_acquire(self) -> bool:
+        """Резервирует один запрос. Возвращает False, если лимит исчерпан."""
+        now = self._clock()
+        self._expire(now)
+        for (limit, _), calls in zip(self.limits, self._windows):
+            if len(calls) >= limit:
+                self.denied += 1
+                return False
+        for calls in self._windows:
+            calls.append(now)
+        if self.api is not None:
+            db.save_api_call(self.api, now, now - self._longest_window())
+        return True
+
+    def _longest_window(self) -> float:
+        return max((window for _, window in self.limits), default=0)
+
+    def load_from_disk(self) -> int:
+        """Восстанавливает окна из БД (запросы до перезапуска тоже расходуют квоту). Возвращает число запросов."""
+        if self.api is None or not self.limits:
+            return 0
+        now = self._clock()
+        called = db.load_api_calls(self.api, now - self._longest_window())
+        for (_, window), calls in zip(self.limits, self._windows):
+            calls.clear()
+            calls.extend(t for t in called if t > now - window)
+        remaining = self.remaining()
+        logger.info(f"Учет запросов к {self.api} восстановлен: {len(called)} запросов, осталось {remaining}.")
+        return len(called)
+
+    def remaining(self) -> int | None:
+        """Сколько запросов еще доступно в самом строгом окне (None, если лимитов нет)."""
+        if not self.limits:
+            return None
+        self._expire(self._clock())
+        return min(limit - len(calls) for (limit, _), calls in zip(self.limits, self._windows))
+
+    def sustained_rate(self) -> float | None:
+        """Допустимая средняя частота запросов (в секунду) по самому длинному окну."""
+        if not self.limits:
+            return None
+        limit, window = max(self.limits, key=lambda item: item[1])
+        return limit / window
+
+
+waqi_quota = QuotaAccountant([
+    (AQICN_DAILY_QUOTA, 24 * 60 * 60),
+    (AQICN_PER_SECOND_LIMIT, 1),
+], api="waqi")
@@ -0,0 +1,203 @@
+# utils/sources.py
+import logging
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+from config import AQICN_API_KEY, AIR_QUALITY_SOURCES
+from utils.aqi import compute_aqi
+from utils import metrics
+from utils.quota import waqi_quota
+
+logger = logging.getLogger(__name__)
+
+AQICN_API_BASE_URL = "https://api.waqi.info/feed/geo:{lat};{lon}/"
+OPEN_METEO_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
+SENSOR_COMMUNITY_URL = "https://data.sensor.community/airrohr/v1/filter/area={lat},{lon},{radius}"
+
+# Названия загрязнителей в отчете (как в ответе /airquality)
+_REPORT_POLLUTANTS = {"pm25": "PM2.5", "pm10": "PM10", "o3": "O3", "co": "CO", "so2": "SO2", "no2": "NO2"}
+
+
+class QuotaExhausted(Exception):
+    """Источник не опрошен, потому что исчерпан лимит запросов."""
+
+
+def _parse_utc(value: str | None) -> float | None:
+    """Время без часового пояса считается UTC. Возвращает UNIX-время или None."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace(" ", "T"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class AirQualitySource(ABC):
+    """
+    Адаптер источника данных о качестве воздуха.
+    fetch() выполняет HTTP-запрос, parse() превращает ответ в список наблюдений:
+    {"source", "station", "aqi", "observed_at" (UNIX-время или None), "local_time", "iaqi"}.
+    parse() не обращается к сети, поэтому адаптер проверяется на сохраненных ответах (фикстурах).
+    Адаптер без request() или parse() не создается (TypeError при configured_sources()).
+    """
+    name = ""
+    # Доверие к источнику при объединении показаний (см. utils/fusion.py)
+    weight = 1.0
+    # Эталонный источник (официальная станция): его единственное наблюдение не отбраковывается как выброс
+    reference = False
+
+    def __init__(self):
+        self._latency = metrics.upstream_duration.series(api=self.name)
+
+    @abstractmethod
+    def request(self, latitude: float, longitude: float) -> tuple[str, dict]:
+        """URL и параметры запроса для координат."""
+
+    @abstractmethod
+    def parse(self, payload, latitude: float, longitude: float) -> list[dict]:
+        """Наблюдения из ответа источника."""
+
+    async def fetch(self, client, latitude: float, longitude: float) -> list[dict]:
+        url, params = self.request(latitude, longitude)
+        started = time.perf_counter()
+        try:
+            response = await client.get(url, params=params, timeout=10)
+        finally:
+            self._latency.observe(time.perf_counter() - started)
+        response.raise_for_status()
+        return self.parse(response.json(), latitude, longitude)
+
+
+class WaqiSource(AirQualitySource):
+    """Станции aqicn.org (WAQI): готовый AQI и суб-индексы загрязнителей."""
+    name = "waqi"
+    weight = 1.0
+    reference = True
+
+    def request(self, latitude, longitude):
+        return AQICN_API_BASE_URL.format(lat=latitude, lon=longitude), {"token": AQICN_API_KEY}
+
+    async def fetch(self, client, latitude, longitude):
+        if not AQICN_API_KEY:
+            logger.error("AQICN_API_KEY не установлен. Невозможно получить данные о качестве воздуха.")
+            return []
+        if not waqi_quota.try_acquire():
+            # Лимит запросов исчерпан: лучше устаревшие данные, чем превышение квоты токена
+            metrics.upstream_errors_total.inc(api="waqi_quota")
+            raise QuotaExhausted("waqi")
+        return await super().fetch(client, latitude, longitude)
+
+    def parse(self, payload, latitude, longitude):
+        if payload.get("status") != "ok":
+            logger.warning(f"Ошибка от AQICN API: {payload.get('data', 'Нет данных или статус не OK')}")
+            return []
+        data = payload["data"]
+        aqi = data.get("aqi")
+        if not isinstance(aqi, (int, float)):
+            # Станция временно не публикует данные (WAQI возвращает "-")
+            return []
+        iaqi = data.get("iaqi", {})  # Индивидуальные индексы загрязнителей
+        time_data = data.get("time", {})
+        return [{
+            "source": self.name,
+            "station": data.get("city", {}).get("name", "Неизвестно"),
+            "aqi": aqi,
+            "observed_at": _parse_utc(time_data.get("iso")),
+            "local_time": time_data.get("s", "Неизвестно"),  # 's' - время станции
+            "iaqi": {label: iaqi[key]["v"] for key, label in _REPORT_POLLUTANTS.items() if key in iaqi},
+        }]
+
+
+class OpenMeteoSource(AirQualitySource):
+    """Модельная сетка Open-Meteo (CAMS): без ключа, текущий US AQI в точке."""
+    name = "open_meteo"
+    weight = 0.5
+
+    def request(self, latitude, longitude):
+        return OPEN_METEO_URL, {
+            "latitude": latitude,
+            "longitude": longitude,
+            "current": "us_aqi,pm2_5,pm10",
+            "timezone": "GMT",
+        }
+
+    def parse(self, payload, latitude, longitude):
+        current = payload.get("current") or {}
+        aqi = current.get("us_aqi")
+        if not isinstance(aqi, (int, float)):
+            concentrations = {"pm25": current.get("pm2_5"), "pm10": current.get("pm10")}
+            aqi, _ = compute_aqi({k: v for k, v in concentrations.items() if isinstance(v, (int, float))})
+        if aqi is None:
+            return []
+        observed_at = _parse_utc(current.get("time"))
+        return [{
+            "source": self.name,
+            "station": "Open-Meteo (модель CAMS)",
+            "aqi": round(aqi),
+            "observed_at": observed_at,
+            "local_time": current.get("time", "Неизвестно"),
+            "iaqi": {},
+        }]
+
+
+class SensorCommunitySource(AirQualitySource):
+    """
+    Народные датчики Sensor.Community в радиусе SEARCH_RADIUS_KM: сырые концентрации PM
+    (P2 — PM2.5, P1 — PM10), AQI вычисляется по формуле EPA. Каждый датчик — отдельное наблюдение.
+    """
+    name = "sensor_community"
+    weight = 0.7
+    SEARCH_RADIUS_KM = 2
+
+    def request(self, latitude, longitude):
+        return SENSOR_COMMUNITY_URL.format(lat=latitude, lon=longitude, radius=self.SEARCH_RADIUS_KM), {}
+
+    def parse(self, payload, latitude, longitude):
+        latest = {}
+        for entry in payload if isinstance(payload, list) else []:
+            sensor_id = (entry.get("sensor") or {}).get("id")
+            observed_at = _parse_utc(entry.get("timestamp"))
+            values = {item.get("value_type"): item.get("value") for item in entry.get("sensordatavalues", [])}
+            concentrations = {}
+            for value_type, pollutant in (("P2", "pm25"), ("P1", "pm10")):
+                try:
+                    concentrations[pollutant] = float(values[value_type])
+                except (KeyError, TypeError, ValueError):
+                    pass
+            aqi, sub_indices = compute_aqi(concentrations)
+            if aqi is None:
+                continue
+            previous = latest.get(sensor_id)
+            if previous is not None and (previous["observed_at"] or 0) >= (observed_at or 0):
+                continue
+            latest[sensor_id] = {
+                "source": self.name,
+                "station": f"Sensor.Community #{sensor_id}",
+                "aqi": aqi,
+                "observed_at": observed_at,
+                "local_time": entry.get("timestamp", "Неизвестно"),
+                "iaqi": {_REPORT_POLLUTANTS[k]: v for k, v in sub_indices.items()},
+            }
+        return list(latest.values())
+
+
+SOURCES = {source.name: source for source in (WaqiSource, OpenMeteoSource, SensorCommunitySource)}
+
+_configured = None
+
+
+def configured_sources() -> list[AirQualitySource]:
+    """Источники из AIR_QUALITY_SOURCES (по умолчанию только WAQI); неизвестные имена пропускаются."""
+    global _configured
+    if _configured is None:
+        _configured = []
+        for name in AIR_QUALITY_SOURCES:
+            if name in SOURCES:
+                _configured.append(SOURCES[name]())
+            else:
+                logger.warning(f"Неизвестный источник данных о качестве воздуха: {name}")
+    return _configured
@@ -0,0 +1,204 @@
+# utils/subscriber_index.py
+import logging
+import time
+from array import array
+from bisect import bisect_right
+
+from utils.alerts import HYSTERESIS_BAND, MAX_AQI_THRESHOLD, STATE_ALERT
+from utils.cache import location_key
+
+logger = logging.getLogger(__name__)
+
+
+def _index_threshold(threshold) -> int:
+    """
+    Порог для индекса в пределах 0..MAX_AQI_THRESHOLD (пороги хранятся в array("i")).
+    Больший порог в БД (записанный до проверки в обработчике) для предварительного отбора
+    равносилен MAX_AQI_THRESHOLD: окончательное решение принимает utils.alerts по значению из БД.
+    """
+    return min(max(int(threshold or 0), 0), MAX_AQI_THRESHOLD)
+
+
+class _StationGroup:
+    """
+    Подписчики одной локации в колоночном виде (типизированные массивы),
+    отсортированные по порогу AQI. Подписки в состоянии тревоги дополнительно хранятся
+    в отдельных массивах, тоже отсортированных по порогу.
+    """
+    __slots__ = ("latitude", "longitude", "thresholds", "user_ids", "chat_ids", "alert_thresholds", "alert_user_ids")
+
+    def __init__(self, latitude: float, longitude: float):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.thresholds = array("i")
+        self.user_ids = array("q")
+        self.chat_ids = array("q")
+        self.alert_thresholds = array("i")
+        self.alert_user_ids = array("q")
+
+    def position_of(self, user_id: int) -> int:
+        """Позиция подписчика в массивах (линейный поиск в массиве, без Python-цикла)."""
+        return self.user_ids.index(user_id)
+
+    def set_alert(self, user_id: int, threshold: int, alert: bool) -> None:
+        """Добавляет подписку в массивы тревоги или убирает из них."""
+        try:
+            position = self.alert_user_ids.index(user_id)
+        except ValueError:
+            position = None
+        if alert and position is None:
+            position = bisect_right(self.alert_thresholds, threshold)
+            self.alert_thresholds.insert(position, threshold)
+            self.alert_user_ids.insert(position, user_id)
+        elif not alert and position is not None:
+            del self.alert_thresholds[position]
+            del self.alert_user_ids[position]
+
+
+class SubscriberIndex:
+    """
+    Индекс активных подписок в памяти для рассылки уведомлений.
+    Подписчики сгруппированы по локации (location_key) и отсортированы по порогу, поэтому
+    поиск тех, у кого порог пересечен, — бинарный поиск и срез массива, без цикла по словарям.
+    Индекс синхронизируется с записями database.db через слушатель изменений.
+    """
+
+    def __init__(self):
+        self._groups = {}
+        self._user_location = {}  # user_id -> ключ локации
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._user_location)
+
+    def build(self, rows) -> None:
+        """Строит индекс из строк db.get_subscriber_columns()."""
+        started = time.perf_counter()
+        grouped = {}
+        skipped = 0
+        for user_id, chat_id, latitude, longitude, threshold, alert_state in rows:
+            try:
+                threshold = _index_threshold(threshold)
+                key = location_key(latitude, longitude)
+            except (TypeError, ValueError):
+                # Одна поврежденная строка не должна мешать запуску бота
+                skipped += 1
+                continue
+            entry = grouped.get(key)
+            if entry is None:
+                entry = grouped[key] = (latitude, longitude, [])
+            entry[2].append((threshold, user_id, chat_id, 1 if alert_state == STATE_ALERT else 0))
+        if skipped:
+            logger.warning(f"В индекс подписчиков не попало поврежденных строк: {skipped}.")
+
+        self._groups = {}
+        self._user_location = {}
+        for key, (latitude, longitude, members) in grouped.items():
+            members.sort()
+            group = _StationGroup(latitude, longitude)
+            group.thresholds = array("i", [m[0] for m in members])
+            group.user_ids = array("q", [m[1] for m in members])
+            group.chat_ids = array("q", [m[2] for m in members])
+            group.alert_thresholds = array("i", [m[0] for m in members if m[3]])
+            group.alert_user_ids = array("q", [m[1] for m in members if m[3]])
+            self._groups[key] = group
+            for user_id in group.user_ids:
+                self._user_location[user_id] = key
+        self.loaded = True
+        logger.info(f"Индекс подписчиков построен: {len(self)} подписок, {len(self._groups)} локаций "
+                    f"за {time.perf_counter() - started:.2f} с.")
+
+    # --- Синхронизация с БД ---
+    def upsert(self, user_id: int, chat_id: int, latitude: float, longitude: float, threshold: int | None) -> None:
+        threshold = _index_threshold(threshold)
+        key = location_key(latitude, longitude)
+        self.remove(user_id)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _StationGroup(latitude, longitude)
+        position = bisect_right(group.thresholds, threshold)
+        group.thresholds.insert(position, threshold)
+        group.user_ids.insert(position, user_id)
+        group.chat_ids.insert(position, chat_id)
+        self._user_location[user_id] = key
+
+    def remove(self, user_id: int) -> None:
+        key = self._user_location.pop(user_id, None)
+        if key is None:
+            return
+        group = self._groups[key]
+        position = group.position_of(user_id)
+        group.set_alert(user_id, group.thresholds[position], False)
+        for column in (group.thresholds, group.user_ids, group.chat_ids):
+            del column[position]
+        if not group.user_ids:
+            del self._groups[key]
+
+    def set_alert_state(self, user_id: int, alert_state: str) -> None:
+        key = self._user_location.get(user_id)
+        if key is None:
+            return
+        group = self._groups[key]
+        group.set_alert(user_id, group.thresholds[group.position_of(user_id)], alert_state == STATE_ALERT)
+
+    def on_db_write(self, event: str, payload) -> None:
+        """Слушатель database.db.add_write_listener."""
+        if event == "upsert":
+            self.upsert(*payload)
+        elif event == "remove":
+            self.remove(payload)
+        elif event == "states":
+            for update in payload:
+                self.set_alert_state(update[-1], update[0])
+
+    # --- Запросы ---
+    def locations(self) -> dict:
+        """{ключ локации: (latitude, longitude)}."""
+        return {key: (group.latitude, group.longitude) for key, group in self._groups.items()}
+
+    def thresholds_by_key(self) -> dict:
+        """{ключ локации: множество порогов подписчиков}."""
+        return {key: set(group.thresholds) for key, group in self._groups.items()}
+
+    def crossed(self, key, aqi: int) -> array:
+        """user_id подписчиков локации, чей порог не выше текущего AQI (бинарный поиск и срез)."""
+        group = self._groups.get(key)
+        if group is None:
+            return array("q")
+        return group.user_ids[:bisect_right(group.thresholds, aqi)]
+
+    def candidates(self, key, aqi: int) -> list[int]:
+        """
+        user_id подписчиков, для которых показание может вызвать событие: порог пересечен
+        (вход в тревогу, ухудшение, сводка для порога 0) или AQI опустился ниже порога
+        на величину гистерезиса у подписок в состоянии тревоги (нормализация).
+        Остальные подписчики локации заведомо не получат уведомления.
+        """
+        group = self._groups.get(key)
+        if group is None:
+            return []
+        candidates = list(group.user_ids[:bisect_right(group.thresholds, aqi)])
+        # Для малых порогов полоса гистерезиса уже (см. alerts._recovery_level): при AQI < HYSTERESIS_BAND
+        # нормализация возможна уже для порогов выше 2 * AQI
+        recovery_start = bisect_right(group.alert_thresholds, aqi + min(HYSTERESIS_BAND, aqi))
+        candidates.extend(group.alert_user_ids[recovery_start:])
+        return candidates
+
+
+subscriber_index = SubscriberIndex()
+_listener_registered = False
+
+
+def load_subscriber_index() -> SubscriberIndex:
+    """
+    Строит индекс из БД и подписывает его на изменения подписок.
+    Повторный вызов перестраивает индекс (например, после замены файла БД).
+    """
+    global _listener_registered
+    from database import db
+
+    if not _listener_registered:
+        db.add_write_listener(subscriber_index.on_db_write)
+        _listener_registered = True
+    subscriber_index.build(db.get_subscriber_columns())
+    return subscriber_index